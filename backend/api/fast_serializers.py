@@ -0,0 +1,216 @@
+from operator import attrgetter, itemgetter
+
+from django.db.models import Manager
+from django.utils.functional import cached_property
+
+from api.serializers import (IngredientSerializer, RecipeReadSerializer,
+                             RecipeShortSerializer, SubscriptionSerializer,
+                             TagSerializer, ingredient_amounts_data,
+                             preload_subscriptions)
+
+
+class FastSerializer:
+    """Сериализатор только для чтения без машинерии полей DRF.
+
+    Для каждого поля один раз на ответ выбирается функция, а объект
+    превращается в словарь одним проходом по этому списку. Строки
+    values() читаются по ключам, объекты - по атрибутам. Вывод, включая
+    выбор полей параметрами запроса, совпадает с serializer_class, это
+    проверяет команда bench_serializers.
+    """
+
+    serializer_class = None
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context if context is not None else {}
+        self.request = self.context.get('request')
+
+    @cached_property
+    def fields(self):
+        """Имя поля -> развёрнуто ли, в порядке Meta.fields."""
+        fields = self.serializer_class.Meta.fields
+        selection = None
+        if hasattr(self.serializer_class, 'get_field_selection'):
+            selection = self.serializer_class.get_field_selection(
+                self.request
+            )
+        if selection is None:
+            return dict.fromkeys(fields, True)
+        selected, expand = selection
+        return {
+            name: (
+                name not in self.serializer_class.expandable_fields
+                or name in expand
+            )
+            for name in fields if name in selected
+        }
+
+    def compile(self, rows):
+        getter = itemgetter if rows else attrgetter
+        compiled = []
+        for name, expanded in self.fields.items():
+            method = f'get_{name}' if expanded else f'get_{name}_collapsed'
+            compiled.append((name, getattr(self, method, None) or getter(
+                name
+            )))
+        return compiled
+
+    def prepare(self, items):
+        """Загружает то, что нужно всем объектам сразу."""
+
+    @cached_property
+    def data(self):
+        if not self.many:
+            self.prepare([self.instance])
+            return self.represent(
+                self.compile(isinstance(self.instance, dict)), self.instance
+            )
+        items = self.instance
+        if isinstance(items, Manager):
+            items = items.all()
+        items = list(items)
+        if not items:
+            return []
+        self.prepare(items)
+        compiled = self.compile(isinstance(items[0], dict))
+        return [self.represent(compiled, item) for item in items]
+
+    @staticmethod
+    def represent(compiled, item):
+        return {name: get(item) for name, get in compiled}
+
+    def image_url(self, image):
+        """Как ImageField DRF: абсолютный URL, если есть запрос."""
+        if not image:
+            return None
+        if self.request is None:
+            return image.url
+        return self.request.build_absolute_uri(image.url)
+
+    def is_subscribed(self, author_id):
+        if self.request.user.is_anonymous:
+            return False
+        return preload_subscriptions(self.context, [author_id])[author_id]
+
+    def preload_subscriptions(self, author_ids):
+        if self.request is not None and self.request.user.is_authenticated:
+            preload_subscriptions(self.context, author_ids)
+
+
+def tag_data(tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'slug': tag.slug,
+    }
+
+
+class FastTagSerializer(FastSerializer):
+    """Быстрый TagSerializer."""
+
+    serializer_class = TagSerializer
+
+
+class FastIngredientSerializer(FastSerializer):
+    """Быстрый IngredientSerializer."""
+
+    serializer_class = IngredientSerializer
+
+
+class FastRecipeShortSerializer(FastSerializer):
+    """Быстрый RecipeShortSerializer."""
+
+    serializer_class = RecipeShortSerializer
+
+    def get_image(self, recipe):
+        return self.image_url(recipe.image)
+
+
+class FastRecipeReadSerializer(FastSerializer):
+    """Быстрый RecipeReadSerializer."""
+
+    serializer_class = RecipeReadSerializer
+
+    def prepare(self, recipes):
+        if self.fields.get('author'):
+            self.preload_subscriptions(
+                {recipe.author_id for recipe in recipes}
+            )
+
+    def get_tags(self, recipe):
+        return [tag_data(tag) for tag in recipe.tags.all()]
+
+    def get_author(self, recipe):
+        author = recipe.author
+        return {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': self.is_subscribed(author.id),
+        }
+
+    @staticmethod
+    def get_author_collapsed(recipe):
+        author = recipe.author
+        return {
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        }
+
+    @staticmethod
+    def get_ingredients(recipe):
+        amounts = getattr(recipe, 'ingredient_amounts', None)
+        if amounts is None:
+            amounts = recipe.recipeingredientamount_set.order_by()
+        return ingredient_amounts_data(amounts)
+
+    def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
+        user = self.request.user
+        if user and not user.is_anonymous:
+            return user.favorites.filter(recipe=recipe).exists()
+        return False
+
+    def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
+        user = self.request.user
+        if not user.is_anonymous:
+            return user.shopping_cart.filter(recipe=recipe).exists()
+        return False
+
+    def get_image(self, recipe):
+        return self.image_url(recipe.image)
+
+
+class FastSubscriptionSerializer(FastSerializer):
+    """Быстрый SubscriptionSerializer."""
+
+    serializer_class = SubscriptionSerializer
+
+    def prepare(self, authors):
+        if 'is_subscribed' in self.fields:
+            self.preload_subscriptions([author.id for author in authors])
+
+    def get_is_subscribed(self, author):
+        return self.is_subscribed(author.id)
+
+    def get_recipes(self, author):
+        recipes_limit = self.request.GET.get('recipes_limit')
+        recipes = author.recipe_author.all()[:int(
+            recipes_limit)] if recipes_limit else author.recipe_author.all()
+        return FastRecipeShortSerializer(recipes, many=True).data
+
+    @staticmethod
+    def get_recipes_count(author):
+        if hasattr(author, 'recipes_count'):
+            return author.recipes_count
+        return author.recipe_author.count()
@@ -0,0 +1,85 @@
+import hashlib
+from calendar import timegm
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from core.generations import get_generation
+
+from .serializers import IdsSerializer
+
+
+class BatchListMixin:
+    """Выдача объектов по списку id: ?ids=1,2,3.
+
+    Объекты проходят те же get_queryset, фильтры и сериализатор, что и
+    обычный список, возвращаются в запрошенном порядке без пагинации.
+    Не найденные id перечисляются в missing.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        serializer = IdsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        objects = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+        serializer = self.get_serializer(
+            [objects[pk] for pk in ids if pk in objects], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in objects],
+        })
+
+
+class ConditionalRetrieveMixin:
+    """Условный GET для retrieve: ETag, Last-Modified и ответ 304.
+
+    get_retrieve_stamp одним запросом по первичному ключу возвращает
+    дату изменения объекта и флаги текущего пользователя. Из них, поколений
+    conditional_generations и формата ответа строится ETag, поэтому 304
+    отдаётся без сериализации и запросов за самим объектом.
+    Last-Modified не учитывает флаги и выдаётся только анонимам.
+    """
+
+    conditional_generations = ()
+
+    def get_retrieve_stamp(self, request):
+        """(дата изменения, флаги пользователя) или None без объекта."""
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            stamp = self.get_retrieve_stamp(request)
+        except (ValueError, ValidationError):
+            stamp = None
+        if stamp is None:
+            return super().retrieve(request, *args, **kwargs)
+        modified, flags = stamp
+        etag = 'W/"{}"'.format(hashlib.sha1(repr((
+            modified.isoformat(),
+            flags,
+            [get_generation(name) for name in self.conditional_generations],
+            request.accepted_renderer.format,
+        )).encode()).hexdigest())
+        last_modified = None
+        if not request.user.is_authenticated:
+            last_modified = timegm(modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        cache_control = {'no_cache': True}
+        if request.user.is_authenticated:
+            cache_control['private'] = True
+        patch_cache_control(response, **cache_control)
+        return response
@@ -1,17 +1,95 @@
+from operator import itemgetter
+
+import orjson
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Manager
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
-from rest_framework.serializers import (IntegerField, ModelSerializer,
-                                        PrimaryKeyRelatedField,
+from rest_framework.serializers import (CharField, ChoiceField, DictField,
+                                        FloatField, ImageField, IntegerField,
+                                        JSONField, ListField, ListSerializer,
+                                        ModelSerializer,
+                                        PrimaryKeyRelatedField, Serializer,
                                         SerializerMethodField)
 from rest_framework.status import HTTP_400_BAD_REQUEST
+from rest_framework.utils import html
 
-from recipes.models import Ingredient, Recipe, RecipeIngredientAmount, Tag
+from recipes.duplicates import index_recipes
+from recipes.models import (Ingredient, Recipe, RecipeIngredientAmount, Tag,
+                            tags_mask)
 from users.models import User
-from core.constants import (MAX_AMOUNT, MAX_COOKING_TIME, MIN_AMOUNT,
-                            MIN_COOKING_TIME)
+from core.batch import BATCH_METHODS, BATCH_REQUEST_HEADERS, resolve_item
+from core.catalog import ingredient_catalog
+from core.changelog import log_change
+from core.constants import (BATCH_REQUEST_COST, MAX_AMOUNT, MAX_BATCH_COST,
+                            MAX_BATCH_IDS, MAX_BATCH_REQUESTS,
+                            MAX_BULK_RECIPES, MAX_COOKING_TIME,
+                            MAX_IMAGE_SIZE, MAX_PANTRY_SIZE, MIN_AMOUNT,
+                            MIN_COOKING_TIME, SYNC_PAGE_SIZE)
+from core.models import ChangeLog
+from core.uploads import check_image_header
+
+
+SPARSE_FIELDS_PARAMS = ('fields', 'omit', 'expand', 'preset')
+MAX_BASE64_IMAGE_LENGTH = (MAX_IMAGE_SIZE + 2) // 3 * 4 + 64
+
+
+def split_names(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Выбор полей ответа параметрами запроса.
+
+    ?fields= и ?omit= оставляют или убирают поля верхнего уровня,
+    ?preset= выбирает готовый набор полей из presets. Поля из
+    expandable_fields выводятся целиком, только если перечислены
+    в ?expand=, иначе - в свёрнутом виде. Без ?expand= развёрнуты все,
+    кроме случая с ?preset=. Параметры действуют только на корневой
+    сериализатор, вложенные выводятся как обычно.
+    """
+
+    presets = {}
+    expandable_fields = {}
+
+    @classmethod
+    def get_field_selection(cls, request):
+        """Пара (поля, развёрнутые поля) или None без параметров."""
+        params = getattr(request, 'query_params', {})
+        if not any(param in params for param in SPARSE_FIELDS_PARAMS):
+            return None
+        preset = cls.presets.get(params.get('preset'))
+        fields = split_names(params.get('fields')) or set(
+            preset or cls.Meta.fields
+        )
+        fields = (fields & set(cls.Meta.fields)) - split_names(
+            params.get('omit')
+        )
+        if 'expand' in params:
+            expand = split_names(params['expand'])
+        else:
+            expand = set() if preset else set(cls.expandable_fields)
+        return fields, expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        selection = None if parent else self.get_field_selection(
+            self.context.get('request')
+        )
+        if selection is None:
+            return fields
+        selected, expand = selection
+        for name in list(fields):
+            if name not in selected:
+                del fields[name]
+            elif name in self.expandable_fields and name not in expand:
+                fields[name] = self.expandable_fields[name](read_only=True)
+        return fields
 
 
 class RegistrationUserCreateSerializer(UserCreateSerializer):
@@ -28,7 +106,51 @@ class RegistrationUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class SubscribeUserSerializer(UserSerializer):
+class AuthorShortSerializer(ModelSerializer):
+    """Сериализатор автора в свёрнутом виде."""
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name')
+        read_only_fields = fields
+
+
+def preload_subscriptions(context, author_ids):
+    """Одним запросом узнаёт, на кого из author_ids подписан пользователь.
+
+    Ответы копятся в context['subscriptions'], который общий у корневого
+    сериализатора и всех вложенных, поэтому уже проверенные авторы
+    повторно не запрашиваются.
+    """
+    subscriptions = context.setdefault('subscriptions', {})
+    pending = set(author_ids) - subscriptions.keys()
+    if not pending:
+        return subscriptions
+    subscribed = set(
+        context['request'].user.subscriber_user.filter(
+            author_id__in=pending
+        ).values_list('author_id', flat=True)
+    )
+    subscriptions.update(
+        (author_id, author_id in subscribed) for author_id in pending
+    )
+    return subscriptions
+
+
+class PreloadSubscriptionsListSerializer(ListSerializer):
+    """Список, заранее загружающий подписки на авторов страницы."""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, Manager) else data
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            author_ids = self.child.get_subscription_author_ids(items)
+            if author_ids:
+                preload_subscriptions(self.context, author_ids)
+        return super().to_representation(items)
+
+
+class SubscribeUserSerializer(SparseFieldsMixin, UserSerializer):
     """Переопределенный Сериализотор пользователя Djoser."""
 
     is_subscribed = SerializerMethodField()
@@ -38,11 +160,18 @@ class SubscribeUserSerializer(UserSerializer):
         fields = ('email', 'id',
                   'username', 'first_name',
                   'last_name', 'is_subscribed')
+        list_serializer_class = PreloadSubscriptionsListSerializer
+
+    def get_subscription_author_ids(self, users):
+        if 'is_subscribed' not in self.fields:
+            return []
+        return [user.id for user in users]
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return not (user.is_anonymous or not user.subscriber_user.filter(
-            author=obj).exists())
+        if user.is_anonymous:
+            return False
+        return preload_subscriptions(self.context, [obj.id])[obj.id]
 
 
 class SubscriptionSerializer(SubscribeUserSerializer):
@@ -63,6 +192,7 @@ class SubscriptionSerializer(SubscribeUserSerializer):
             'recipes',
             'recipes_count',
         )
+        list_serializer_class = PreloadSubscriptionsListSerializer
         read_only_fields = (
             'email',
             'username',
@@ -72,6 +202,8 @@ class SubscriptionSerializer(SubscribeUserSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipe_author.count()
 
     def get_recipes(self, obj):
@@ -148,9 +280,79 @@ class RecipeIngredientAmountSerializer(ModelSerializer):
         )
 
 
-class RecipeReadSerializer(ModelSerializer):
+def ingredient_amounts_data(amounts):
+    """Ингредиенты с количеством без соединения с Ingredient.
+
+    Название и единица берутся из общего каталога core.catalog
+    (чего в нём ещё нет - из базы), порядок - по названию, как при
+    сортировке в базе.
+    """
+    amounts = list(amounts)
+    rows = [
+        (entry[0], {
+            'id': amount.ingredient_id,
+            'name': entry[1],
+            'measurement_unit': entry[2],
+            'amount': amount.amount,
+        })
+        for amount, entry in zip(amounts, ingredient_catalog.entries(
+            amount.ingredient_id for amount in amounts
+        ))
+        if entry is not None
+    ]
+    return [row for _, row in sorted(rows, key=itemgetter(0))]
+
+
+class IngredientAmountListSerializer(ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        return ingredient_amounts_data(data)
+
+
+class IngredientAmountReadSerializer(Serializer):
+    """Сериализатор ингредиента с количеством для чтения.
+
+    Списком выводится через ingredient_amounts_data.
+    """
+
+    id = IntegerField(source='ingredient_id')
+    name = SerializerMethodField()
+    measurement_unit = SerializerMethodField()
+    amount = IntegerField()
+
+    class Meta:
+        list_serializer_class = IngredientAmountListSerializer
+
+    def get_name(self, obj):
+        entry = ingredient_catalog.get(obj.ingredient_id)
+        return entry and entry[0]
+
+    def get_measurement_unit(self, obj):
+        entry = ingredient_catalog.get(obj.ingredient_id)
+        return entry and entry[1]
+
+
+class RecipeReadSerializer(SparseFieldsMixin, ModelSerializer):
     """Сериализатор для просмотра полного рецепта."""
 
+    presets = {
+        'compact': (
+            'id',
+            'tags',
+            'author',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'image',
+            'cooking_time',
+        ),
+    }
+    expandable_fields = {
+        'author': AuthorShortSerializer,
+    }
+
     author = SubscribeUserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = SerializerMethodField()
@@ -171,27 +373,113 @@ class RecipeReadSerializer(ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = PreloadSubscriptionsListSerializer
+
+    def get_subscription_author_ids(self, recipes):
+        author = self.fields.get('author')
+        if not isinstance(author, SubscribeUserSerializer):
+            return []
+        return author.get_subscription_author_ids(
+            recipe.author for recipe in recipes
+        )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user and not user.is_anonymous:
             return user.favorites.filter(recipe=obj).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if not user.is_anonymous:
             return user.shopping_cart.filter(recipe=obj).exists()
         return False
 
     def get_ingredients(self, obj):
-        return (
-            obj.ingredients.values(
-                'id',
-                'name',
-                'measurement_unit',
-                amount=F('recipeingredientamount__amount')
+        amounts = getattr(obj, 'ingredient_amounts', None)
+        if amounts is None:
+            amounts = obj.recipeingredientamount_set.order_by()
+        return IngredientAmountReadSerializer(amounts, many=True).data
+
+
+class CommaSeparatedIdsField(ListField):
+    """Список id: JSON-массив или значения через запятую в query-параметре."""
+
+    child = IntegerField(min_value=1)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        if isinstance(data, (list, tuple)):
+            data = [
+                item for value in data
+                for item in str(value).split(',') if item.strip()
+            ]
+        return super().to_internal_value(data)
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка base64-строкой в JSON или файлом в multipart-форме.
+
+    Файл из формы уже лежит во временном файле и проверяется по
+    заголовку, не попадая в память целиком.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            check_image_header(data)
+            return ImageField.to_internal_value(self, data)
+        if isinstance(data, str) and len(data) > MAX_BASE64_IMAGE_LENGTH:
+            raise ValidationError(
+                f'Размер файла больше {MAX_IMAGE_SIZE // 1024 ** 2} МБ.'
             )
+        image = super().to_internal_value(data)
+        if image:
+            check_image_header(image)
+        return image
+
+
+class IdsSerializer(Serializer):
+    """Сериализатор списка id для выборки пачкой."""
+
+    ids = CommaSeparatedIdsField(allow_empty=False, max_length=MAX_BATCH_IDS)
+
+
+class PantrySerializer(Serializer):
+    """Сериализатор набора продуктов пользователя."""
+
+    ingredients = CommaSeparatedIdsField(max_length=MAX_PANTRY_SIZE)
+    max_missing = IntegerField(min_value=0, required=False)
+
+
+class SyncSerializer(Serializer):
+    """Сериализатор параметров синхронизации."""
+
+    since = IntegerField(min_value=0, required=False)
+    limit = IntegerField(
+        min_value=1, max_value=SYNC_PAGE_SIZE, default=SYNC_PAGE_SIZE
+    )
+
+
+class PantryRecipeSerializer(RecipeShortSerializer):
+    """Сериализатор рецепта, подобранного по продуктам."""
+
+    coverage = FloatField(read_only=True)
+    missing_count = IntegerField(read_only=True)
+    missing_ingredients = IngredientAmountReadSerializer(
+        many=True,
+        read_only=True,
+    )
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + (
+            'coverage',
+            'missing_count',
+            'missing_ingredients',
         )
 
 
@@ -211,7 +499,7 @@ class WriteRecipeSerializer(ModelSerializer):
         queryset=Tag.objects.all(),
         many=True,
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = SubscribeUserSerializer(read_only=True)
     cooking_time = IntegerField(
         min_value=MIN_COOKING_TIME,
@@ -230,6 +518,27 @@ class WriteRecipeSerializer(ModelSerializer):
             'cooking_time',
         )
 
+    def to_internal_value(self, data):
+        """В multipart-форме tags - повторяющееся поле, а ingredients -
+        JSON-строка с тем же списком, что и в JSON-запросе."""
+        if html.is_html_input(data):
+            data = self.form_to_dict(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def form_to_dict(data):
+        result = {key: data.get(key) for key in data}
+        if 'tags' in data:
+            result['tags'] = data.getlist('tags')
+        if isinstance(result.get('ingredients'), str):
+            try:
+                result['ingredients'] = orjson.loads(result['ingredients'])
+            except orjson.JSONDecodeError:
+                raise ValidationError({
+                    'ingredients': 'Ожидается JSON-список ингредиентов.'
+                })
+        return result
+
     def validate_ingredients(self, value):
 
         ingredients = empty_field('ingredients', value)
@@ -239,12 +548,21 @@ class WriteRecipeSerializer(ModelSerializer):
             })
         ingredients_in_recipe = set()
         for ingredient in ingredients:
-            ingredient_tuple = tuple(ingredient.items())
-            if ingredient_tuple in ingredients_in_recipe:
+            if ingredient['id'] in ingredients_in_recipe:
                 raise ValidationError({
                     'ingredients': 'Вы уже добавили этот ингредиент!'
                 })
-            ingredients_in_recipe.add(ingredient_tuple)
+            ingredients_in_recipe.add(ingredient['id'])
+        ids = [ingredient['id'] for ingredient in ingredients]
+        unknown = {
+            pk for pk, entry in zip(ids, ingredient_catalog.entries(ids))
+            if entry is None
+        }
+        if unknown:
+            raise ValidationError(
+                'Нет ингредиентов с id '
+                f'{", ".join(map(str, sorted(unknown)))}.'
+            )
         return value
 
     def validate_tags(self, value):
@@ -281,6 +599,8 @@ class WriteRecipeSerializer(ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.bulk_create_recipe_ingredient(recipe, ingredients)
+        self.duplicates = index_recipes([recipe.id])[recipe.id]
+        log_change(ChangeLog.RECIPE, ChangeLog.CREATE, recipe.id)
         return recipe
 
     @transaction.atomic
@@ -292,7 +612,12 @@ class WriteRecipeSerializer(ModelSerializer):
             RecipeIngredientAmount.objects.filter(recipe=instance).delete()
             ingredients = validated_data.pop('ingredients')
             self.bulk_create_recipe_ingredient(instance, ingredients)
-        return super().update(instance, validated_data)
+        # Сохранение рецепта сдвигает updated_at (auto_now) один раз,
+        # в том числе когда меняются только ингредиенты.
+        instance = super().update(instance, validated_data)
+        self.duplicates = index_recipes([instance.id])[instance.id]
+        log_change(ChangeLog.RECIPE, ChangeLog.UPDATE, instance.id)
+        return instance
 
     def to_representation(self, instance):
         request = self.context['request']
@@ -301,3 +626,130 @@ class WriteRecipeSerializer(ModelSerializer):
             instance=instance,
             context=context,
         ).data
+
+
+class BulkRecipeSerializer(WriteRecipeSerializer):
+    """Рецепт из пачки для массовой загрузки.
+
+    Теги и их биты маски берутся из словаря, загруженного один раз
+    на всю пачку (см. preload_bulk_lookups), а не запросом на каждый
+    рецепт.
+    """
+
+    tags = ListField(child=IntegerField(min_value=1))
+
+    def validate_tags(self, value):
+        value = super().validate_tags(value)
+        unknown = set(value) - self.context['tag_bits'].keys()
+        if unknown:
+            raise ValidationError(
+                f'Нет тегов с id {", ".join(map(str, sorted(unknown)))}.'
+            )
+        return value
+
+    def build(self, author):
+        """Рецепт без pk, id его тегов и строки ингредиентов
+        для recipes.importing.create_recipes."""
+        data = self.validated_data
+        recipe = Recipe(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            image=data['image'],
+            cooking_time=data['cooking_time'],
+            tags_mask=tags_mask(
+                self.context['tag_bits'][pk] for pk in data['tags']
+            ),
+        )
+        ingredients = [
+            (item['id'], item['amount']) for item in data['ingredients']
+        ]
+        return recipe, data['tags'], ingredients
+
+
+def collect_ids(items, field, key=None):
+    """id из сырых данных пачки, некорректные значения пропускаются."""
+    ids = set()
+    for item in items:
+        values = item.get(field) if isinstance(item, dict) else None
+        for value in values if isinstance(values, list) else ():
+            if key is not None:
+                value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, int):
+                ids.add(value)
+    return ids
+
+
+def preload_bulk_lookups(context, items):
+    """Загружает в контекст биты маски существующих тегов пачки по id."""
+    context['tag_bits'] = dict(Tag.objects.filter(
+        pk__in=collect_ids(items, 'tags')
+    ).values_list('pk', 'bit'))
+    return context
+
+
+class BulkRecipesSerializer(Serializer):
+    """Пачка рецептов: JSON-массив или JSONL."""
+
+    recipes = ListField(
+        child=DictField(), allow_empty=False, max_length=MAX_BULK_RECIPES
+    )
+
+
+class BatchItemSerializer(Serializer):
+    """Подзапрос пакета: метод, адрес внутри /api/ и JSON-тело."""
+
+    method = ChoiceField(choices=BATCH_METHODS)
+    url = CharField()
+    body = JSONField(required=False)
+    headers = DictField(child=CharField(), required=False, default=dict)
+    group = CharField(required=False, max_length=50)
+
+    def validate_url(self, value):
+        if not value.startswith('/api/'):
+            raise ValidationError('Адрес должен начинаться с /api/.')
+        return value
+
+    def validate_headers(self, value):
+        value = {name.lower(): header for name, header in value.items()}
+        unknown = set(value) - set(BATCH_REQUEST_HEADERS)
+        if unknown:
+            raise ValidationError(
+                f'Недопустимые заголовки: {", ".join(sorted(unknown))}.'
+            )
+        return value
+
+    def validate(self, data):
+        data['resolved'] = resolve_item(data['method'], data['url'])
+        if data['resolved'] and data['resolved'][0].view_name == 'api:batch':
+            raise ValidationError({
+                'url': 'Вложенные пакеты не поддерживаются.'
+            })
+        return data
+
+
+class BatchSerializer(Serializer):
+    """Пакет подзапросов для /api/batch/."""
+
+    requests = BatchItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_BATCH_REQUESTS
+    )
+
+    def validate_requests(self, value):
+        groups = [item.get('group') for item in value]
+        for index, group in enumerate(groups):
+            if group is not None and group in groups[:index] and (
+                groups[index - 1] != group
+            ):
+                raise ValidationError(
+                    f'Подзапросы группы {group} должны идти подряд.'
+                )
+        cost = sum(
+            item['resolved'][3] if item['resolved'] else BATCH_REQUEST_COST
+            for item in value
+        )
+        if cost > MAX_BATCH_COST:
+            raise ValidationError(
+                f'Стоимость пакета {cost} больше {MAX_BATCH_COST}.'
+            )
+        return value
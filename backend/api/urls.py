@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.views import (BatchView, IngredientViewSet, RecipeViewSet, SyncView,
+                       TagViewSet)
 
 app_name = 'api'
 
@@ -11,5 +12,7 @@ router_v1.register('recipes', RecipeViewSet, 'recipes')
 router_v1.register('tags', TagViewSet, 'tags')
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('', include(router_v1.urls)),
 ]
@@ -1,48 +1,115 @@
-from django.db.models import F, Sum
+from collections import defaultdict
+
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Sum
+from django.db.models.functions import Greatest
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-from weasyprint import HTML
 
-from recipes.models import (Cart, FavoriteRecipe, Ingredient, Recipe,
-                            RecipeIngredientAmount, Tag)
+from recipes.importing import create_recipes
+from recipes.models import (Cart, CartIngredient, FavoriteRecipe,
+                            Ingredient, Recipe, RecipeIngredientAmount, Tag)
 from users.models import Subscription, User
+from core.batch import BatchRunner
+from core.catalog import ingredient_catalog
+from core.changelog import log_change, read_changes
+from core.constants import FEED_CACHE_TIMEOUT
 from core.filters import IngredientFilter, RecipeFilter
+from core.generations import (INGREDIENTS_GENERATION, RANKINGS_GENERATION,
+                              RECIPES_GENERATION, TAGS_GENERATION)
+from core.metrics import metrics
+from core.models import ChangeLog
 from core.pagination import CartPagination, CustomPagination
+from core.pantry import pantry_index
+from core.parsers import JSONLinesParser, ORJSONParser
 from core.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (SubscribeUserSerializer, IngredientSerializer,
-                          RecipeReadSerializer, RecipeShortSerializer,
-                          SubscriptionSerializer, TagSerializer,
-                          WriteRecipeSerializer)
-
-
-class SubscriptionUserViewSet(UserViewSet):
+from core.response_cache import CompressedResponseCacheMixin
+from core.shopping_list import get_shopping_list_renderer
+from core.throttling import TokenBucketThrottle
+from core.uploads import LimitedUploadMixin
+from .fast_serializers import (FastIngredientSerializer,
+                               FastRecipeReadSerializer,
+                               FastRecipeShortSerializer,
+                               FastSubscriptionSerializer, FastTagSerializer)
+from .mixins import BatchListMixin, ConditionalRetrieveMixin
+from .serializers import (BatchSerializer, BulkRecipeSerializer,
+                          BulkRecipesSerializer,
+                          IngredientAmountReadSerializer,
+                          IngredientSerializer, PantryRecipeSerializer,
+                          PantrySerializer, RecipeReadSerializer,
+                          SubscribeUserSerializer, SubscriptionSerializer,
+                          SyncSerializer, TagSerializer,
+                          WriteRecipeSerializer, preload_bulk_lookups)
+
+
+def catalog_rows(rows):
+    """(id ингредиента, количество) -> (название, количество, единица)."""
+    rows = list(rows)
+    for (_, amount), entry in zip(rows, ingredient_catalog.entries(
+        ingredient_id for ingredient_id, _ in rows
+    )):
+        if entry is not None:
+            yield entry[1], amount, entry[2]
+
+
+def merge_shopping_list(*groups):
+    """Суммирует строки списка покупок из нескольких источников."""
+    totals = defaultdict(int)
+    for rows in groups:
+        for name, amount, measurement_unit in rows:
+            totals[name, measurement_unit] += amount
+    return [
+        (name, amount, measurement_unit)
+        for (name, measurement_unit), amount in sorted(totals.items())
+    ]
+
+
+class SubscriptionUserViewSet(ConditionalRetrieveMixin, BatchListMixin,
+                              UserViewSet):
     """Custom Djoser viewset for User model."""
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True)
     serializer_class = SubscribeUserSerializer
     pagination_class = CustomPagination
 
+    def get_retrieve_stamp(self, request):
+        user = request.user
+        user_id = user.id if self.action == 'me' else self.kwargs['id']
+        queryset = self.queryset.filter(pk=user_id)
+        flags = ()
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+            flags = ('is_subscribed',)
+        row = queryset.values_list('updated_at', *flags).first()
+        return row and (row[0], row[1:])
+
     @action(
         methods=['post'],
         detail=True,
         permission_classes=[IsAuthenticated],
     )
     def subscribe(self, request, id):
-        author = get_object_or_404(User, id=id)
+        author = get_object_or_404(self.queryset, id=id)
         serializer = SubscriptionSerializer(
             author,
             data=request.data,
             context={"request": request},
         )
         serializer.is_valid(raise_exception=True)
-        Subscription.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            Subscription.objects.create(user=request.user, author=author)
+            log_change(ChangeLog.SUBSCRIPTION, ChangeLog.CREATE, author.id,
+                       request.user.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -52,7 +119,10 @@ class SubscriptionUserViewSet(UserViewSet):
             user=request.user,
             author=get_object_or_404(User, id=id),
         )
-        subscription.delete()
+        with transaction.atomic():
+            subscription.delete()
+            log_change(ChangeLog.SUBSCRIPTION, ChangeLog.DELETE,
+                       subscription.author_id, request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False,
@@ -60,51 +130,170 @@ class SubscriptionUserViewSet(UserViewSet):
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        subscriptions = User.objects.filter(author_in_subscription__user=user)
+        subscriptions = self.queryset.filter(
+            author_in_subscription__user=user
+        )
+        fields = (SubscriptionSerializer.get_field_selection(request) or (
+            SubscriptionSerializer.Meta.fields, ()
+        ))[0]
+        if 'recipes_count' in fields:
+            subscriptions = subscriptions.annotate(
+                recipes_count=Count('recipe_author', filter=Q(
+                    recipe_author__pending_deletion=False
+                ))
+            ).order_by(*User._meta.ordering)
         serializer_context = {'request': request}
         paginated_subscriptions = self.paginate_queryset(subscriptions)
 
-        serializer = SubscriptionSerializer(
+        serializer = FastSubscriptionSerializer(
             paginated_subscriptions,
             many=True,
             context=serializer_context)
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CompressedResponseCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
 
-    queryset = Ingredient.objects.all()
-    serializer_class = IngredientSerializer
+    response_cache_generation = INGREDIENTS_GENERATION
+    queryset = Ingredient.objects.values(*IngredientSerializer.Meta.fields)
+    serializer_class = FastIngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_costs = {'list': 1}
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CompressedResponseCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
-    queryset = Tag.objects.all()
-    serializer_class = TagSerializer
+    response_cache_generation = TAGS_GENERATION
+    queryset = Tag.objects.values(*TagSerializer.Meta.fields)
+    serializer_class = FastTagSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(LimitedUploadMixin, ConditionalRetrieveMixin,
+                    CompressedResponseCacheMixin, BatchListMixin,
+                    ModelViewSet):
     """Вьюсет для отображения рецептов
     на главной странице, в корзине и в избранном."""
 
+    response_cache_generation = (
+        RECIPES_GENERATION,
+        TAGS_GENERATION,
+        INGREDIENTS_GENERATION,
+        RANKINGS_GENERATION,
+    )
+    response_cache_anonymous_only = True
+    response_cache_timeout = FEED_CACHE_TIMEOUT
+    response_cache_precompressed = False
+    conditional_generations = (TAGS_GENERATION, INGREDIENTS_GENERATION)
+
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_costs = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'download_shopping_cart': 10,
+        'bulk': 20,
+    }
+
+    def get_queryset(self):
+        """Только соединения и подзапросы, нужные выбранным полям."""
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        fields = (RecipeReadSerializer.get_field_selection(
+            self.request
+        ) or (RecipeReadSerializer.Meta.fields, ()))[0]
+        user = self.request.user
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipeingredientamount_set',
+                queryset=RecipeIngredientAmount.objects.order_by(),
+                to_attr='ingredient_amounts',
+            ))
+        if 'is_favorited' in fields and user.is_authenticated:
+            queryset = queryset.annotate(is_favorited=Exists(
+                FavoriteRecipe.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
+        if 'is_in_shopping_cart' in fields and user.is_authenticated:
+            queryset = queryset.annotate(is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
+        return queryset
+
+    def get_retrieve_stamp(self, request):
+        user = request.user
+        queryset = Recipe.objects.filter(pk=self.kwargs['pk'])
+        flags = ()
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(Cart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            )
+            flags = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+        row = queryset.annotate(
+            modified=Greatest('updated_at', 'author__updated_at')
+        ).values_list('modified', *flags).first()
+        return row and (row[0], row[1:])
+
+    def create(self, request, *args, **kwargs):
+        return self.link_duplicates(super().create(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        return self.link_duplicates(super().update(request, *args, **kwargs))
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.duplicates = serializer.duplicates
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.duplicates = serializer.duplicates
+
+    def link_duplicates(self, response):
+        """Похожие рецепты, найденные при сохранении, - в заголовок Link
+        с rel="duplicate"; сами пары ждут проверки в админке."""
+        duplicates = getattr(self, 'duplicates', ())
+        if duplicates:
+            response['Link'] = ', '.join(
+                '<{}>; rel="duplicate"'.format(
+                    self.request.build_absolute_uri(
+                        reverse('api:recipes-detail', args=(pk,))
+                    )
+                )
+                for pk, _ in duplicates
+            )
+        return response
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        recipe_id = instance.id
+        instance.delete()
+        log_change(ChangeLog.RECIPE, ChangeLog.DELETE, recipe_id)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
-            return RecipeReadSerializer
+            return FastRecipeReadSerializer
         return WriteRecipeSerializer
 
     @action(
@@ -121,11 +310,14 @@ class RecipeViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        FavoriteRecipe.objects.create(
-            user=self.request.user,
-            recipe=recipe
-        )
-        serializer = RecipeShortSerializer(recipe)
+        with transaction.atomic():
+            FavoriteRecipe.objects.create(
+                user=self.request.user,
+                recipe=recipe
+            )
+            log_change(ChangeLog.FAVORITE, ChangeLog.CREATE, recipe.id,
+                       request.user.id)
+        serializer = FastRecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @favorite.mapping.delete
@@ -133,7 +325,10 @@ class RecipeViewSet(ModelViewSet):
         del_favorite = request.user.favorites.filter(recipe__id=pk)
 
         if del_favorite.exists():
-            del_favorite.delete()
+            with transaction.atomic():
+                del_favorite.delete()
+                log_change(ChangeLog.FAVORITE, ChangeLog.DELETE, int(pk),
+                           request.user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(
@@ -157,11 +352,15 @@ class RecipeViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        Cart.objects.create(
-            user=self.request.user,
-            recipe=recipe
-        )
-        serializer = RecipeShortSerializer(recipe)
+        with transaction.atomic():
+            request.user.cart_ingredients.filter(recipe=recipe).delete()
+            Cart.objects.create(
+                user=self.request.user,
+                recipe=recipe
+            )
+            log_change(ChangeLog.CART, ChangeLog.CREATE, recipe.id,
+                       request.user.id)
+        serializer = FastRecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
@@ -170,7 +369,10 @@ class RecipeViewSet(ModelViewSet):
         del_cart = request.user.shopping_cart.filter(recipe__id=pk)
 
         if del_cart.exists():
-            del_cart.delete()
+            with transaction.atomic():
+                del_cart.delete()
+                log_change(ChangeLog.CART, ChangeLog.DELETE, int(pk),
+                           request.user.id)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -182,6 +384,159 @@ class RecipeViewSet(ModelViewSet):
 
         )
 
+    @action(
+        methods=['post'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        parser_classes=[ORJSONParser, JSONLinesParser],
+    )
+    def bulk(self, request):
+        """Массовая загрузка рецептов JSON-массивом или JSONL.
+
+        Рецепты с ошибками пропускаются, остальные создаются одной
+        транзакцией. Если её отвергла база, рецепты создаются по одному,
+        как в import_recipes. С ?atomic=true ошибка в любом рецепте
+        отменяет всю пачку.
+        """
+        serializer = BulkRecipesSerializer(data={'recipes': request.data})
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['recipes']
+        context = preload_bulk_lookups(self.get_serializer_context(), items)
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            serializer = BulkRecipeSerializer(data=item, context=context)
+            if serializer.is_valid():
+                rows.append((index, serializer.build(request.user)))
+                results.append({'index': index})
+            else:
+                results.append({'index': index, 'errors': serializer.errors})
+        atomic = request.query_params.get('atomic', '').lower() in (
+            '1', 'true'
+        )
+        if rows and not (atomic and len(rows) < len(items)):
+            self.create_bulk_rows(rows, results, atomic)
+        created = sum('id' in result for result in results)
+        failed = sum('errors' in result for result in results)
+        if not failed:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': created, 'failed': failed, 'results': results},
+            status=response_status,
+        )
+
+    @staticmethod
+    def create_bulk_rows(rows, results, atomic):
+        """Создаёт рецепты пачки, rows - пары (индекс, строка build).
+
+        Рецепты, которые отвергла база, получают ошибку в results.
+        """
+        error = {'non_field_errors': ['Рецепт не удалось сохранить.']}
+        try:
+            recipes = create_recipes([row for _, row in rows])
+        except DatabaseError:
+            if atomic:
+                for index, _ in rows:
+                    results[index]['errors'] = error
+                return
+        else:
+            for (index, _), recipe in zip(rows, recipes):
+                results[index]['id'] = recipe.pk
+            return
+        for index, row in rows:
+            try:
+                results[index]['id'] = create_recipes([row])[0].pk
+            except DatabaseError:
+                results[index]['errors'] = error
+
+    @action(detail=False, methods=['get'])
+    def pantry(self, request):
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        pantry = set(serializer.validated_data['ingredients'])
+        matches = self.paginate_queryset(pantry_index.match(
+            pantry, serializer.validated_data.get('max_missing')
+        ))
+        recipes = Recipe.objects.in_bulk(
+            [match.recipe_id for match in matches]
+        )
+        missing_ingredients = defaultdict(list)
+        for amount in RecipeIngredientAmount.objects.filter(
+            recipe__in=recipes
+        ).exclude(ingredient__in=pantry).order_by():
+            missing_ingredients[amount.recipe_id].append(amount)
+        page = []
+        for match in matches:
+            if match.recipe_id not in recipes:
+                continue
+            recipe = recipes[match.recipe_id]
+            recipe.coverage = match.coverage
+            recipe.missing_count = match.missing
+            recipe.missing_ingredients = missing_ingredients[recipe.id]
+            page.append(recipe)
+        serializer = PantryRecipeSerializer(
+            page,
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['post'],
+        detail=True,
+        permission_classes=[IsAuthenticated],
+    )
+    def pantry_cart(self, request, pk):
+        recipe = get_object_or_404(Recipe, id=pk)
+
+        if request.user.shopping_cart.filter(recipe=recipe).exists():
+            return Response(
+                {'errors': 'Рецепт уже в списке покупок!'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = PantrySerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        missing = recipe.recipeingredientamount_set.exclude(
+            ingredient__in=serializer.validated_data.get('ingredients', [])
+        ).order_by()
+
+        if not missing:
+            return Response(
+                {'errors': 'Все ингредиенты рецепта уже есть!'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            request.user.cart_ingredients.filter(recipe=recipe).delete()
+            CartIngredient.objects.bulk_create([
+                CartIngredient(
+                    user=request.user,
+                    recipe=recipe,
+                    ingredient_id=amount.ingredient_id,
+                    amount=amount.amount,
+                ) for amount in missing
+            ])
+        serializer = IngredientAmountReadSerializer(missing, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @pantry_cart.mapping.delete
+    def remove_pantry_cart(self, request, pk):
+        del_missing = request.user.cart_ingredients.filter(recipe__id=pk)
+
+        if del_missing.exists():
+            del_missing.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        return Response(
+            {'errors': 'Вы уже удалили эти ингредиенты!'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     def cart_text(self, user, ingredients, date):
         text = (
             f'Привет, {user.first_name}!\n\n'
@@ -204,16 +559,69 @@ class RecipeViewSet(ModelViewSet):
         self.queryset = Cart.objects.all().order_by('-id', )
         self.pagination_class = CartPagination
         ingredients = RecipeIngredientAmount.objects.filter(
-            recipe__shopping_cart__user=self.request.user).values(
-            name=F('ingredient__name'),
-            measurement_unit=F('ingredient__measurement_unit')
-        ).annotate(amount=Sum('amount')).values_list(
-            'ingredient__name', 'amount', 'ingredient__measurement_unit')
-        html_template = render_to_string('cart/shop_list.html',
-                                         {'ingredients': ingredients})
-        html = HTML(string=html_template)
-        result = html.write_pdf()
+            recipe__shopping_cart__user=self.request.user,
+            recipe__pending_deletion=False
+        ).order_by().values('ingredient_id').annotate(
+            amount=Sum('amount')
+        ).values_list('ingredient_id', 'amount')
+        missing = request.user.cart_ingredients.filter(
+            recipe__pending_deletion=False
+        ).order_by().values_list('ingredient_id', 'amount')
+        renderer = get_shopping_list_renderer(
+            request.query_params.get('renderer')
+        )
+        with metrics.timer(
+            'shopping_list_render_seconds',
+            renderer=type(renderer).__name__,
+        ):
+            result = renderer.render(
+                merge_shopping_list(
+                    catalog_rows(ingredients), catalog_rows(missing)
+                )
+            )
         response = HttpResponse(result, content_type='application/pdf;')
         response['Content-Disposition'] = 'inline; filename=shopping_list.pdf'
         response['Content-Transfer-Encoding'] = 'binary'
         return response
+
+
+class SyncView(APIView):
+    """Изменения для клиента после токена: /api/sync/?since=<token>.
+
+    Возвращает id созданных, изменённых и удалённых рецептов, а также
+    добавленных и убранных рецептов избранного, корзины и авторов
+    подписок. Сами рецепты клиент догружает через /api/recipes/?ids=.
+    Удалённый рецепт пропадает и из избранного, и из корзины.
+    Новый токен передаётся в следующий запрос; при has_more
+    запрос нужно повторить сразу. full_resync означает, что токена нет
+    или он устарел: нужно загрузить всё заново и продолжить с токена.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        serializer = SyncSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(read_changes(
+            request.user.id,
+            serializer.validated_data.get('since'),
+            serializer.validated_data['limit'],
+        ))
+
+
+class BatchView(APIView):
+    """Несколько запросов к API за один: POST /api/batch/.
+
+    Подзапросы выполняются по порядку от имени пользователя пакета,
+    у каждого свой статус и тело. Подзапросы с одинаковым group
+    выполняются в одной транзакции (см. core.batch.BatchRunner).
+    Число подзапросов ограничено MAX_BATCH_REQUESTS, их суммарная
+    стоимость с весами дорогих действий - MAX_BATCH_COST.
+    """
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': BatchRunner(request).run(
+            serializer.validated_data['requests']
+        )})
@@ -0,0 +1,128 @@
+from django.contrib import admin, messages
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.deletion import schedule_deletion
+from core.models import DeletionJob
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений.
+
+    Подходит для связей с большими таблицами: боковая панель не
+    загружает всех пользователей или рецепты.
+    """
+
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ((None, None),)
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.lookup: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = (
+            (name, value)
+            for name, value in changelist.get_filters_params().items()
+            if name != self.parameter_name
+        )
+        yield all_choice
+
+
+def input_filter(parameter_name, lookup, title):
+    """Класс InputFilter для поиска по значению lookup."""
+    return type(
+        f'{parameter_name.capitalize()}InputFilter',
+        (InputFilter,),
+        {'parameter_name': parameter_name, 'lookup': lookup, 'title': title},
+    )
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на объект через field.
+
+    В отличие от Count по соединению, считается только для строк
+    текущей страницы и не размножает строки при нескольких счётчиках.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class DeferredDeletionAdmin(admin.ModelAdmin):
+    """Удаление через DeletionJob вместо синхронного каскада.
+
+    Объект скрывается сразу, а страница подтверждения не собирает
+    все зависимые строки, которых у активного автора сотни тысяч.
+    """
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+        self.message_deferred(request, 1)
+
+    def delete_queryset(self, request, queryset):
+        objs = list(queryset)
+        for obj in objs:
+            schedule_deletion(obj)
+        self.message_deferred(request, len(objs))
+
+    def message_deferred(self, request, count):
+        self.message_user(
+            request,
+            f'Скрыто объектов: {count}. Они удалятся в фоне командой '
+            'run_deletion_jobs.',
+            messages.INFO,
+        )
+
+    def get_deleted_objects(self, objs, request):
+        opts = self.model._meta
+        objs = list(objs)
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(opts.verbose_name)
+        return (
+            [str(obj) for obj in objs],
+            {opts.verbose_name_plural: len(objs)},
+            perms_needed,
+            [],
+        )
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    """Админ панель задач фонового удаления."""
+
+    list_display = (
+        'object_repr',
+        'content_type',
+        'status',
+        'step',
+        'deleted_rows',
+        'updated_at',
+    )
+    list_filter = (
+        'status',
+    )
+    readonly_fields = (
+        'content_type',
+        'object_id',
+        'object_repr',
+        'status',
+        'step',
+        'deleted_rows',
+        'error',
+    )
+
+    def has_add_permission(self, request):
+        return False
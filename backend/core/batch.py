@@ -0,0 +1,166 @@
+import logging
+from io import BytesIO
+from itertools import groupby
+from urllib.parse import urlsplit
+
+import orjson
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+
+from core.constants import BATCH_REQUEST_COST
+from core.generations import memoize_generations
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+BATCH_REQUEST_HEADERS = {
+    'if-none-match': 'HTTP_IF_NONE_MATCH',
+    'if-modified-since': 'HTTP_IF_MODIFIED_SINCE',
+}
+BATCH_RESPONSE_HEADERS = (
+    'ETag', 'Last-Modified', 'Link', 'Location', 'Retry-After',
+)
+REPLACED_META = (
+    'HTTP_ACCEPT_ENCODING', 'CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING',
+    *BATCH_REQUEST_HEADERS.values(),
+)
+
+logger = logging.getLogger(__name__)
+
+
+class GroupFailed(Exception):
+    """Подзапрос группы завершился ошибкой, группа откатывается."""
+
+
+def resolve_item(method, url):
+    """(совпадение маршрута, путь, строка запроса, стоимость)
+    подзапроса или None, если такого адреса нет.
+
+    Стоимость - BATCH_REQUEST_COST плюс вес действия из throttle_costs
+    вьюхи, тот же, что списывает TokenBucketThrottle.
+    """
+    parts = urlsplit(url)
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        return None
+    view = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    cost = BATCH_REQUEST_COST + getattr(view, 'throttle_costs', {}).get(
+        actions.get(method.lower()), 0
+    )
+    return match, parts.path, parts.query, cost
+
+
+class BatchRunner:
+    """Выполняет подзапросы пакета внутри одного запроса Django.
+
+    Подзапросы получают пользователя пакета без повторной
+    аутентификации и проходят обычные вьюхи с их правами, троттлингом
+    и кешем ответов. Поколения данных читаются из кеша один раз
+    на пакет, одинаковые GET до первой записи выполняются один раз.
+    Подзапросы с общим group выполняются в одной транзакции: ошибка
+    любого из них откатывает группу, а оставшиеся не выполняются.
+    Исключение во вьюхе становится статусом 500 своего подзапроса,
+    а не всего пакета.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.responses = {}
+
+    def run(self, items):
+        results = []
+        with memoize_generations():
+            for group, group_items in groupby(
+                items, key=lambda item: item.get('group')
+            ):
+                if group is None:
+                    results.extend(map(self.call, group_items))
+                else:
+                    results.extend(self.run_group(list(group_items)))
+        return results
+
+    def run_group(self, items):
+        results = []
+        try:
+            with transaction.atomic():
+                for item in items:
+                    results.append(self.call(item))
+                    if results[-1]['status'] >= 400:
+                        raise GroupFailed
+        except GroupFailed:
+            self.responses.clear()
+            for result in results[:-1]:
+                result['rolled_back'] = True
+            results += [
+                {
+                    'status': 424,
+                    'body': {'errors': 'Не выполнен: ошибка в группе.'},
+                }
+                for _ in items[len(results):]
+            ]
+        return results
+
+    def call(self, item):
+        method = item['method']
+        key = (item['url'], tuple(sorted(item['headers'].items())))
+        if method != 'GET':
+            self.responses.clear()
+        elif key in self.responses:
+            return dict(self.responses[key])
+        if item['resolved'] is None:
+            return {'status': 404, 'body': {'detail': 'Страница не найдена.'}}
+        match, path, query, _ = item['resolved']
+        request = self.make_request(
+            method, path, query, item.get('body'), item['headers']
+        )
+        request.resolver_match = match
+        try:
+            response = match.func(request, *match.args, **match.kwargs)
+        except Exception:
+            logger.exception('Ошибка подзапроса пакета %s %s', method, path)
+            return {
+                'status': 500,
+                'body': {'detail': 'Внутренняя ошибка сервера.'},
+            }
+        if hasattr(response, 'render'):
+            response.render()
+        result = {'status': response.status_code}
+        headers = {
+            name: response[name]
+            for name in BATCH_RESPONSE_HEADERS if response.has_header(name)
+        }
+        if headers:
+            result['headers'] = headers
+        if response.content and response.get(
+            'Content-Type', ''
+        ).startswith('application/json'):
+            result['body'] = orjson.loads(response.content)
+        if method == 'GET' and response.status_code == 200:
+            self.responses[key] = result
+        return result
+
+    def make_request(self, method, path, query, body, headers):
+        content = b'' if body is None else orjson.dumps(body)
+        environ = {
+            name: value for name, value in self.request.META.items()
+            if name not in REPLACED_META
+        }
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'HTTP_ACCEPT': 'application/json',
+            'wsgi.input': BytesIO(content),
+        })
+        environ.update(
+            (BATCH_REQUEST_HEADERS[name], value)
+            for name, value in headers.items()
+        )
+        request = WSGIRequest(environ)
+        if self.request.user.is_authenticated:
+            request._force_auth_user = self.request.user
+            request._force_auth_token = self.request.auth
+        return request
@@ -0,0 +1,168 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from core.constants import CATALOG_CHECK_INTERVAL
+from core.generations import INGREDIENTS_GENERATION, get_generation
+
+MAGIC = b'FGINGR02'
+HEADER = struct.Struct('=8sqII')
+SEPARATOR = '\0'
+MISSING = 0xFFFFFFFF
+
+
+def write_catalog(path, generation):
+    """Пишет файл каталога из базы и атомарно подменяет им старый.
+
+    Отображения старого файла у воркеров остаются рабочими, пока
+    они не перечитают новый.
+    """
+    from recipes.models import Ingredient
+
+    rows = list(Ingredient.objects.order_by('name', 'id').values_list(
+        'id', 'name', 'measurement_unit'
+    ))
+    size = max((row[0] for row in rows), default=0) + 1
+    ranks = array('I', [MISSING]) * size
+    starts = array('I')
+    records = bytearray()
+    start = HEADER.size + ranks.itemsize * (size + len(rows) + 1)
+    for rank, (ingredient_id, name, unit) in enumerate(rows):
+        ranks[ingredient_id] = rank
+        starts.append(start + len(records))
+        records += f'{name}{SEPARATOR}{unit}'.encode()
+    starts.append(start + len(records))
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, generation, size, len(rows)))
+        ranks.tofile(file)
+        starts.tofile(file)
+        file.write(records)
+    os.replace(temporary, path)
+
+
+def read_generation(path):
+    try:
+        with open(path, 'rb') as file:
+            magic, generation, *_ = HEADER.unpack(file.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return generation if magic == MAGIC else None
+
+
+class IngredientCatalog:
+    """Справочник ингредиентов id -> (название, единица) в общей памяти.
+
+    Файл каталога - заголовок, место каждого id в сортировке по
+    названию (uint32, индекс - id), начала записей по местам и сами
+    записи "название\\0единица" в UTF-8 в порядке сортировки. Воркеры
+    отображают его в память только на чтение, поэтому страницы файла
+    одни на всех, а поиск - два обращения к массивам. Раз
+    в CATALOG_CHECK_INTERVAL секунд поколение ингредиентов из кеша
+    сверяется с заголовком: после изменения Ingredient первый
+    заметивший воркер пересобирает файл под блокировкой, остальные
+    отображают готовый.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = -CATALOG_CHECK_INTERVAL
+        self.snapshot = (b'', (), ())
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < CATALOG_CHECK_INTERVAL:
+            return self.snapshot
+        generation = get_generation(INGREDIENTS_GENERATION)
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    self.load(generation)
+        self.checked_at = now
+        return self.snapshot
+
+    def load(self, generation):
+        path = self.path or settings.INGREDIENT_CATALOG_PATH
+        with open(f'{path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if read_generation(path) != generation:
+                write_catalog(path, generation)
+            with open(path, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, size, count = HEADER.unpack_from(buffer)
+        arrays = memoryview(buffer)[HEADER.size:].cast('B')
+        itemsize = array('I').itemsize
+        self.snapshot = (
+            buffer,
+            arrays[:size * itemsize].cast('I'),
+            arrays[size * itemsize:(size + count + 1) * itemsize].cast('I'),
+        )
+        self.generation = generation
+
+    def entries(self, ingredient_ids):
+        """(место в сортировке по названию, название, единица) или None
+        для каждого id.
+
+        Поколение сверяется один раз на вызов, а при промахе - сразу
+        ещё раз, чтобы только что добавленный ингредиент не ждал
+        интервала проверки. Чего нет и в свежем каталоге (поколение
+        ещё не сдвинулось после фиксации), ищется в базе; такие записи
+        получают место MISSING и при сортировке идут последними.
+        None - только если ингредиента нет и в базе.
+        """
+        ingredient_ids = list(ingredient_ids)
+        buffer, ranks, starts = self.refresh()
+        if not all(
+            0 <= pk < len(ranks) and ranks[pk] != MISSING
+            for pk in ingredient_ids
+        ):
+            buffer, ranks, starts = self.refresh(force=True)
+        entries = []
+        for pk in ingredient_ids:
+            rank = ranks[pk] if 0 <= pk < len(ranks) else MISSING
+            if rank == MISSING:
+                entries.append(None)
+                continue
+            name, _, unit = str(
+                buffer[starts[rank]:starts[rank + 1]], 'utf-8'
+            ).partition(SEPARATOR)
+            entries.append((rank, name, unit))
+        if None in entries:
+            self.fill_from_database(ingredient_ids, entries)
+        return entries
+
+    @staticmethod
+    def fill_from_database(ingredient_ids, entries):
+        from recipes.models import Ingredient
+
+        missing = {
+            pk for pk, entry in zip(ingredient_ids, entries) if entry is None
+        }
+        found = {
+            pk: (MISSING, name, unit)
+            for pk, name, unit in Ingredient.objects.filter(
+                pk__in=missing
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        for index, pk in enumerate(ingredient_ids):
+            if entries[index] is None:
+                entries[index] = found.get(pk)
+
+    def get(self, ingredient_id):
+        """(название, единица измерения) или None, если id нет."""
+        entry = self.entries((ingredient_id,))[0]
+        return entry and entry[1:]
+
+    def __contains__(self, ingredient_id):
+        return self.get(ingredient_id) is not None
+
+
+ingredient_catalog = IngredientCatalog()
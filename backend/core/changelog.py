@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from core.constants import (CHANGELOG_LOCK_ID, SYNC_COMMIT_LAG,
+                            SYNC_PAGE_SIZE)
+from core.models import ChangeLog
+
+SYNC_SECTIONS = {
+    ChangeLog.RECIPE: 'recipes',
+    ChangeLog.FAVORITE: 'favorites',
+    ChangeLog.CART: 'shopping_cart',
+    ChangeLog.SUBSCRIPTION: 'subscriptions',
+}
+
+
+# Бэкенды, где id журнала выдаются в порядке фиксации транзакций:
+# SQLite пускает одного писателя за раз, а в PostgreSQL запись
+# в журнал берёт транзакционную advisory-блокировку.
+COMMIT_ORDERED_VENDORS = ('postgresql', 'sqlite')
+
+
+def lock_changelog():
+    """Держит запись в журнал до конца транзакции.
+
+    Следующий писатель получит id только после фиксации текущего,
+    поэтому видимая запись гарантирует, что все меньшие id тоже видны.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)', [CHANGELOG_LOCK_ID]
+            )
+
+
+def log_change(kind, action, object_id, user_id=None):
+    """Пишет изменение в журнал.
+
+    Вызывать последним запросом транзакции изменения: блокировка
+    журнала держится до её фиксации.
+    """
+    with transaction.atomic():
+        lock_changelog()
+        ChangeLog.objects.create(
+            kind=kind, action=action, object_id=object_id, user_id=user_id
+        )
+
+
+def log_changes(kind, action, object_ids, user_id=None):
+    with transaction.atomic():
+        lock_changelog()
+        ChangeLog.objects.bulk_create(
+            ChangeLog(
+                kind=kind, action=action, object_id=object_id,
+                user_id=user_id,
+            )
+            for object_id in object_ids
+        )
+
+
+def empty_changes():
+    changes = {
+        section: {'added': [], 'removed': []}
+        for section in SYNC_SECTIONS.values()
+    }
+    changes['recipes'] = {'created': [], 'updated': [], 'deleted': []}
+    return changes
+
+
+def summarize(rows):
+    """Итог записей по каждому объекту: важны первое и последнее действие.
+
+    Рецепт, созданный и удалённый после токена, клиент не видел,
+    поэтому в ответ он не попадает.
+    """
+    actions = {}
+    for kind, action, object_id in rows:
+        first, _ = actions.get((kind, object_id), (action, None))
+        actions[kind, object_id] = (first, action)
+    changes = empty_changes()
+    for (kind, object_id), (first, last) in sorted(actions.items()):
+        section = changes[SYNC_SECTIONS[kind]]
+        if kind != ChangeLog.RECIPE:
+            section[
+                'removed' if last == ChangeLog.DELETE else 'added'
+            ].append(object_id)
+        elif last == ChangeLog.DELETE:
+            if first != ChangeLog.CREATE:
+                section['deleted'].append(object_id)
+        else:
+            section[
+                'created' if first == ChangeLog.CREATE else 'updated'
+            ].append(object_id)
+    return changes
+
+
+def read_changes(user_id, since=None, limit=SYNC_PAGE_SIZE):
+    """Изменения после токена since, видимые пользователю.
+
+    На бэкендах без COMMIT_ORDERED_VENDORS записи моложе
+    SYNC_COMMIT_LAG секунд не отдаются: транзакция с меньшим id могла
+    ещё не зафиксироваться, и токен бы её перескочил. Если since
+    не задан или записи после него уже удалены компактизацией,
+    возвращается full_resync и токен, с которого
+    продолжать после полной загрузки.
+    """
+    settled = ChangeLog.objects.all()
+    if connection.vendor not in COMMIT_ORDERED_VENDORS:
+        settled = settled.filter(created_at__lt=timezone.now() - timedelta(
+            seconds=SYNC_COMMIT_LAG
+        ))
+    latest = settled.order_by('-id').values_list('id', flat=True).first()
+    settled = settled.filter(id__lte=latest or 0)
+    oldest = ChangeLog.objects.aggregate(oldest=Min('id'))['oldest']
+    if since is None or (oldest is not None and since < oldest - 1):
+        return {
+            'token': str(latest or 0),
+            'full_resync': True,
+            'has_more': False,
+            **empty_changes(),
+        }
+    rows = list(settled.filter(
+        Q(user_id__isnull=True) | Q(user_id=user_id), id__gt=since
+    ).order_by('id').values_list('id', 'kind', 'action', 'object_id')[
+        :limit + 1
+    ])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        token = rows[-1][0]
+    else:
+        token = max(since, latest or 0)
+    return {
+        'token': str(token),
+        'full_resync': False,
+        'has_more': has_more,
+        **summarize(row[1:] for row in rows),
+    }
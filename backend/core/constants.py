@@ -13,3 +13,37 @@ MAX_COOKING_TIME = 1000
 MIN_AMOUNT = 1
 MAX_AMOUNT = 50000
 max_limit = 100
+MAX_PANTRY_SIZE = 500
+MAX_TAG_BIT = 62
+MAX_TAGS_MASK_VALUES = 1024
+MIN_COMPRESS_LENGTH = 200
+BROTLI_QUALITY = 5
+CACHED_BROTLI_QUALITY = 6
+GZIP_LEVEL = 6
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+MAX_BATCH_IDS = 100
+MAX_IMAGE_SIZE = 10 * 1024 ** 2
+MAX_IMAGE_SIDE = 5000
+TRENDING_HALF_LIFE_DAYS = 7
+TRENDING_WINDOW_HALF_LIVES = 10
+MAX_BULK_RECIPES = 100
+RESPONSE_CACHE_WAIT = 2
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+FEED_CACHE_TIMEOUT = 5 * 60
+COUNT_CACHE_TIMEOUT = 30
+ESTIMATE_MIN_ROWS = 10000
+DELETION_BATCH_SIZE = 1000
+SYNC_PAGE_SIZE = 1000
+SYNC_COMMIT_LAG = 5
+CHANGELOG_LOCK_ID = 4711
+CHANGELOG_RETENTION_DAYS = 30
+CATALOG_CHECK_INTERVAL = 1
+METRICS_FLUSH_INTERVAL = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+DUPLICATE_SIMILARITY = 0.8
+MAX_DUPLICATE_CANDIDATES = 100
+MAX_BATCH_REQUESTS = 20
+MAX_BATCH_COST = 60
+BATCH_REQUEST_COST = 1
@@ -0,0 +1,164 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F, Q
+
+from core.changelog import log_changes
+from core.constants import DELETION_BATCH_SIZE
+from core.generations import RECIPES_GENERATION, bump_generation
+from core.models import ChangeLog, DeletionJob
+from recipes.models import (Cart, CartIngredient, FavoriteRecipe, Recipe,
+                            RecipeBucket, RecipeDuplicate,
+                            RecipeIngredientAmount, RecipeRanking,
+                            RecipeSignature)
+from users.models import Subscription
+
+User = get_user_model()
+RECIPE_DEPENDENTS = (
+    ('ингредиенты рецептов', RecipeIngredientAmount, 'recipe'),
+    ('теги рецептов', Recipe.tags.through, 'recipe'),
+    ('избранное', FavoriteRecipe, 'recipe'),
+    ('корзины', Cart, 'recipe'),
+    ('недостающие ингредиенты', CartIngredient, 'recipe'),
+    ('рейтинги', RecipeRanking, 'recipe'),
+    ('подписи для поиска дублей', RecipeSignature, 'recipe'),
+    ('LSH-индекс дублей', RecipeBucket, 'recipe'),
+    ('дубли рецептов', RecipeDuplicate, 'recipe'),
+    ('дубли других рецептов', RecipeDuplicate, 'original'),
+)
+
+
+def recipe_plan(recipe_id):
+    """Шаги удаления рецепта: (название, выборка, удалять ли без каскада)."""
+    return [
+        (step, model._base_manager.filter(**{f'{field}_id': recipe_id}),
+         True)
+        for step, model, field in RECIPE_DEPENDENTS
+    ] + [('рецепт', Recipe._base_manager.filter(pk=recipe_id), False)]
+
+
+def user_plan(user_id):
+    """Шаги удаления пользователя вместе с его рецептами."""
+    return [
+        (step, model._base_manager.filter(
+            **{f'{field}__author_id': user_id}
+        ), True)
+        for step, model, field in RECIPE_DEPENDENTS
+    ] + [
+        ('избранное пользователя',
+         FavoriteRecipe._base_manager.filter(user_id=user_id), True),
+        ('корзина пользователя',
+         Cart._base_manager.filter(user_id=user_id), True),
+        ('недостающие ингредиенты пользователя',
+         CartIngredient._base_manager.filter(user_id=user_id), True),
+        ('подписки', Subscription._base_manager.filter(
+            Q(user_id=user_id) | Q(author_id=user_id)
+        ), True),
+        ('рецепты', Recipe._base_manager.filter(author_id=user_id), False),
+        ('пользователь', User._base_manager.filter(pk=user_id), False),
+    ]
+
+
+DELETION_PLANS = {
+    Recipe: recipe_plan,
+    User: user_plan,
+}
+
+
+def schedule_deletion(obj):
+    """Скрывает объект и ставит его в очередь на удаление.
+
+    Рецепт пропадает из выдачи сразу, пользователь становится
+    неактивным, а его рецепты скрываются. Для синхронизации клиентов
+    это удаление рецептов и подписок на пользователя. Строки удаляет
+    run_deletion_jobs.
+    """
+    with transaction.atomic():
+        if isinstance(obj, Recipe):
+            recipes = Recipe._base_manager.filter(pk=obj.pk)
+        else:
+            User._base_manager.filter(pk=obj.pk).update(is_active=False)
+            recipes = Recipe._base_manager.filter(author_id=obj.pk)
+            subscriber_ids = list(Subscription.objects.filter(
+                author_id=obj.pk
+            ).values_list('user_id', flat=True))
+        recipe_ids = list(
+            recipes.filter(pending_deletion=False).values_list(
+                'pk', flat=True
+            )
+        )
+        recipes.update(pending_deletion=True)
+        job, _ = DeletionJob.objects.get_or_create(
+            content_type=ContentType.objects.get_for_model(obj),
+            object_id=obj.pk,
+            defaults={'object_repr': str(obj)[:200]},
+        )
+        # Журнал пишется последним: его блокировка держится до фиксации.
+        log_changes(ChangeLog.RECIPE, ChangeLog.DELETE, recipe_ids)
+        if not isinstance(obj, Recipe):
+            ChangeLog.objects.bulk_create(
+                ChangeLog(
+                    kind=ChangeLog.SUBSCRIPTION,
+                    action=ChangeLog.DELETE,
+                    object_id=obj.pk,
+                    user_id=subscriber_id,
+                )
+                for subscriber_id in subscriber_ids
+            )
+        transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
+    return job
+
+
+def delete_batch(queryset, raw, batch_size):
+    """Удаляет до batch_size строк выборки, возвращает их число.
+
+    Зависимые строки удаляются одним DELETE без сборщика каскада:
+    их собственные зависимости уже удалены предыдущими шагами.
+    """
+    ids = list(
+        queryset.order_by().values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    batch = queryset.model._base_manager.filter(pk__in=ids)
+    if raw:
+        return batch._raw_delete(batch.db)
+    return batch.delete()[0]
+
+
+def run_deletion_job(job, batch_size=DELETION_BATCH_SIZE, pause=0,
+                     progress=None):
+    """Выполняет задачу удаления пачками в коротких транзакциях.
+
+    Каждый шаг удаляет то, что осталось, поэтому прерванную или
+    упавшую задачу можно просто запустить снова. progress вызывается
+    после каждой пачки с названием шага и числом удалённых строк.
+    """
+    jobs = DeletionJob.objects.filter(pk=job.pk)
+    jobs.update(status=DeletionJob.RUNNING, error='')
+    plan = DELETION_PLANS[job.content_type.model_class()](job.object_id)
+    try:
+        for step, queryset, raw in plan:
+            while True:
+                with transaction.atomic():
+                    deleted = delete_batch(queryset, raw, batch_size)
+                    if deleted:
+                        jobs.update(
+                            step=step,
+                            deleted_rows=F('deleted_rows') + deleted,
+                        )
+                if not deleted:
+                    break
+                if progress is not None:
+                    progress(step, deleted)
+                if pause:
+                    time.sleep(pause)
+    except Exception as error:
+        jobs.update(status=DeletionJob.FAILED, error=repr(error))
+        raise
+    jobs.update(status=DeletionJob.DONE, step='')
+    bump_generation(RECIPES_GENERATION)
+    job.refresh_from_db()
+    return job
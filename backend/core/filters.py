@@ -1,7 +1,19 @@
-from django.db.models import Q
+from django.db.models import F, Q
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, Tag, tags_mask
+from core.constants import MAX_TAGS_MASK_VALUES
+
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+TAGS_MODES = (
+    (TAGS_MODE_ANY, 'Любой из тегов'),
+    (TAGS_MODE_ALL, 'Все теги'),
+)
+RANKING_ORDERINGS = (
+    ('trending', 'Популярные сейчас'),
+    ('popular', 'Чаще всего в избранном'),
+)
 
 
 def get_queryset_filter(queryset, user, value, relation):
@@ -12,6 +24,43 @@ def get_queryset_filter(queryset, user, value, relation):
     return queryset.exclude(**{relation: user})
 
 
+def submasks(mask):
+    """Все подмаски битовой маски, включая пустую."""
+    submask = mask
+    while True:
+        yield submask
+        if not submask:
+            return
+        submask = (submask - 1) & mask
+
+
+def filter_by_tags_mask(queryset, mask, all_tags=False):
+    """Фильтрация по маске тегов без соединения с таблицей тегов.
+
+    Пока тегов немного, подходящие значения маски перечисляются заранее
+    и условие сводится к tags_mask IN (...) по индексу. Иначе проверяется
+    побитовое И.
+    """
+    known = tags_mask(Tag.objects.values_list('bit', flat=True))
+    free = known & ~mask
+    if 1 << bin(free if all_tags else known).count('1') <= (
+        MAX_TAGS_MASK_VALUES
+    ):
+        if all_tags:
+            values = [mask | submask for submask in submasks(free)]
+        else:
+            values = [
+                submask | free_submask
+                for submask in submasks(mask) if submask
+                for free_submask in submasks(free)
+            ]
+        return queryset.filter(tags_mask__in=values)
+    queryset = queryset.annotate(tags_match=F('tags_mask').bitand(mask))
+    if all_tags:
+        return queryset.filter(tags_match=mask)
+    return queryset.exclude(tags_match=0)
+
+
 class IngredientFilter(FilterSet):
     """Фильтрация ингредиентов по названию"""
     name = filters.CharFilter(method='ingredient_name_filter')
@@ -36,12 +85,44 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='tags_filter',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES,
+        method='tags_mode_filter',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=RANKING_ORDERINGS,
+        method='ordering_filter',
     )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return filter_by_tags_mask(
+            queryset=queryset,
+            mask=tags_mask(tag.bit for tag in value),
+            all_tags=self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ALL,
+        )
+
+    def tags_mode_filter(self, queryset, name, value):
+        """Режим учитывается в tags_filter."""
+        return queryset
+
+    def ordering_filter(self, queryset, name, value):
+        """Порядок по рейтингу из refresh_rankings.
+
+        Рецепты, ещё не попавшие в пересчёт, идут в конце.
+        """
+        return queryset.order_by(
+            F(f'ranking__{value}').desc(nulls_last=True),
+            *Recipe._meta.ordering,
+        )
+
     def is_favorited_filter(self, queryset, name, value):
         return get_queryset_filter(
             queryset=queryset,
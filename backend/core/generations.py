@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{name}'
+RECIPES_GENERATION = 'recipes'
+TAGS_GENERATION = 'tags'
+INGREDIENTS_GENERATION = 'ingredients'
+RANKINGS_GENERATION = 'rankings'
+memo = ContextVar('generations_memo', default=None)
+
+
+@contextmanager
+def memoize_generations():
+    """Поколения читаются из кеша один раз на весь блок.
+
+    Нужно для /api/batch/: подзапросы одного пакета не ходят в кеш
+    за одними и теми же поколениями. Сдвиг поколения внутри блока
+    сбрасывает запомненное значение.
+    """
+    token = memo.set({})
+    try:
+        yield
+    finally:
+        memo.reset(token)
+
+
+def get_generation(name):
+    """Текущее поколение данных, общее для всех воркеров."""
+    generations = memo.get()
+    if generations is not None and name in generations:
+        return generations[name]
+    key = GENERATION_KEY.format(name=name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    if generations is not None:
+        generations[name] = generation
+    return generation
+
+
+def bump_generation(name):
+    """Сдвигает поколение, чтобы воркеры сбросили свои копии данных.
+
+    Если ключ вытеснен из кеша, поколение начинается с текущего времени,
+    поэтому не может совпасть с уже виденным воркерами значением.
+    """
+    generations = memo.get()
+    if generations is not None:
+        generations.pop(name, None)
+    key = GENERATION_KEY.format(name=name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.incr(key)
@@ -0,0 +1,107 @@
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import orjson
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+SIDES = (500, 1500, 2500)
+
+
+def noise_jpeg(side):
+    """JPEG из шума - худший случай для сжатия."""
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Время и пиковая память создания рецепта с картинкой '
+            'в base64 JSON и в multipart-форме.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sides', type=int, nargs='+', default=SIDES)
+
+    def handle(self, *args, **options):
+        print(f'{"body":<10} {"side":>6} {"KiB":>8} {"ms":>8} '
+              f'{"peak KiB":>10}')
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), \
+                transaction.atomic():
+            self.user = User.objects.create(
+                username='bench_upload', email='bench_upload@example.com'
+            )
+            self.fields = {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'tags': [Tag.objects.create(
+                    name='bench_upload', color='#000', slug='bench_upload'
+                ).id],
+                'ingredients': [{'id': Ingredient.objects.create(
+                    name='bench_upload', measurement_unit='г'
+                ).id, 'amount': 1}],
+            }
+            for side in options['sides']:
+                image = noise_jpeg(side)
+                for body in ('base64', 'multipart'):
+                    self.report(body, side, image)
+            transaction.set_rollback(True)
+
+    def report(self, body, side, image):
+        self.send(self.build(body, image))
+        request = self.build(body, image)
+        started = time.perf_counter()
+        self.send(request)
+        elapsed = (time.perf_counter() - started) * 1000
+        # Тело запроса собирается заранее: в реальном запросе оно
+        # читается из сокета и в пиковую память не входит.
+        request = self.build(body, image)
+        tracemalloc.start()
+        self.send(request)
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        print(f'{body:<10} {side:>6} {len(image) / 1024:>8.0f} '
+              f'{elapsed:>8.1f} {peak:>10.0f}')
+
+    def build(self, body, image):
+        factory = APIRequestFactory()
+        if body == 'base64':
+            request = factory.post(
+                '/api/recipes/',
+                orjson.dumps({
+                    **self.fields,
+                    'image': 'data:image/jpeg;base64,'
+                    + base64.b64encode(image).decode(),
+                }),
+                content_type='application/json',
+            )
+        else:
+            upload = BytesIO(image)
+            upload.name = 'image.jpg'
+            request = factory.post('/api/recipes/', {
+                **self.fields,
+                'ingredients': orjson.dumps(
+                    self.fields['ingredients']
+                ).decode(),
+                'image': upload,
+            }, format='multipart')
+        force_authenticate(request, self.user)
+        return request
+
+    def send(self, request):
+        response = RecipeViewSet.as_view({'post': 'create'})(request)
+        if response.status_code != 201:
+            raise RuntimeError(response.data)
@@ -0,0 +1,177 @@
+import mmap
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from api.serializers import ingredient_amounts_data
+from core.catalog import IngredientCatalog
+from core.generations import INGREDIENTS_GENERATION, get_generation
+from recipes.models import Ingredient, Recipe, RecipeIngredientAmount
+
+
+def joined_page(size):
+    """Страница рецептов с ингредиентами через JOIN, как было раньше."""
+    recipes = Recipe.objects.prefetch_related(Prefetch(
+        'recipeingredientamount_set',
+        queryset=RecipeIngredientAmount.objects.select_related(
+            'ingredient'
+        ).order_by('ingredient__name', 'ingredient_id'),
+        to_attr='ingredient_amounts',
+    ))[:size]
+    return [
+        [
+            {
+                'id': amount.ingredient_id,
+                'name': amount.ingredient.name,
+                'measurement_unit': amount.ingredient.measurement_unit,
+                'amount': amount.amount,
+            }
+            for amount in recipe.ingredient_amounts
+        ]
+        for recipe in recipes
+    ]
+
+
+def catalog_page(size):
+    """Та же страница: только строки количеств, остальное из каталога."""
+    recipes = Recipe.objects.prefetch_related(Prefetch(
+        'recipeingredientamount_set',
+        queryset=RecipeIngredientAmount.objects.order_by(),
+        to_attr='ingredient_amounts',
+    ))[:size]
+    return [
+        ingredient_amounts_data(recipe.ingredient_amounts)
+        for recipe in recipes
+    ]
+
+
+def wall_time(func, repeat):
+    """Среднее время вызова в миллисекундах."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def heap_size(func):
+    """Память Python, занятая результатом func, в КиБ."""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    return result, size
+
+
+def mapping_memory(path):
+    """Rss и Pss отображения файла в текущем процессе, КиБ."""
+    rss = pss = 0
+    inside = False
+    with open('/proc/self/smaps') as smaps:
+        for line in smaps:
+            fields = line.split()
+            if not fields[0].endswith(':'):
+                inside = fields[-1] == path
+            elif inside and fields[0] == 'Rss:':
+                rss += int(fields[1])
+            elif inside and fields[0] == 'Pss:':
+                pss += int(fields[1])
+    return rss, pss
+
+
+def worker(path, generation, barrier, results):
+    catalog = IngredientCatalog(path)
+    catalog.load(generation)
+    sum(catalog.snapshot[0][::mmap.PAGESIZE])
+    barrier.wait()
+    results.put(mapping_memory(path))
+    barrier.wait()
+
+
+class Command(BaseCommand):
+    help = ('Память воркеров и время сериализации ингредиентов '
+            'рецептов: общий каталог против JOIN и словаря в процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError('В базе нет ингредиентов.')
+        page_size, repeat = options['page_size'], options['repeat']
+        if joined_page(page_size) != catalog_page(page_size):
+            raise CommandError('Ингредиенты из каталога отличаются от JOIN.')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ingredient_catalog.bin')
+            self.memory(path, options['workers'])
+            self.lookups(path, repeat)
+        print(f'\n{"page of recipes":<28} {"ms":>9}')
+        for title, func in (
+            ('JOIN ingredient', joined_page),
+            ('catalog', catalog_page),
+        ):
+            ms = wall_time(lambda func=func: func(page_size), repeat)
+            print(f'{title:<28} {ms:>9.3f}')
+
+    @staticmethod
+    def memory(path, workers):
+        generation = get_generation(INGREDIENTS_GENERATION)
+        catalog = IngredientCatalog(path)
+        _, catalog_heap = heap_size(lambda: catalog.load(generation))
+        _, dict_heap = heap_size(lambda: {
+            pk: (name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        })
+        print(f'{Ingredient.objects.count()} ингредиентов, файл каталога '
+              f'{os.path.getsize(path) / 1024:.0f} КиБ')
+        print(f'\n{"per worker":<28} {"KiB":>9}')
+        print(f'{"dict in process heap":<28} {dict_heap:>9.0f}')
+        print(f'{"catalog heap":<28} {catalog_heap:>9.0f}')
+        if not os.path.exists('/proc/self/smaps'):
+            return
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=worker, args=(path, generation, barrier, results)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        memory = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        rss = sum(row[0] for row in memory) / workers
+        pss = sum(row[1] for row in memory) / workers
+        print(f'{f"catalog mapping Rss, {workers} w":<28} {rss:>9.0f}')
+        print(f'{f"catalog mapping Pss, {workers} w":<28} {pss:>9.0f}')
+
+    @staticmethod
+    def lookups(path, repeat):
+        catalog = IngredientCatalog(path)
+        ids = list(Ingredient.objects.values_list('id', flat=True))
+        names = {
+            pk: (name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        print(f'\n{"lookup":<28} {"ns":>9}')
+        catalog.get(ids[0])
+        for title, func in (
+            ('dict', lambda: [names.get(pk) for pk in ids]),
+            ('catalog get', lambda: [catalog.get(pk) for pk in ids]),
+            ('catalog entries', lambda: catalog.entries(ids)),
+        ):
+            ms = wall_time(func, repeat)
+            print(f'{title:<28} {ms * 1e6 / len(ids):>9.0f}')
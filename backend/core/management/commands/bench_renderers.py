@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.middleware import compress
+from core.renderers import ORJSONRenderer
+
+INGREDIENTS_FILE = (
+    settings.BASE_DIR / 'recipes/management/commands/data/ingredients.json'
+)
+RECIPE_TEXT = 'Нарежьте овощи, обжарьте на сливочном масле и тушите. ' * 10
+
+
+def recipes_page(size=100):
+    """Страница рецептов в форме ответа RecipeReadSerializer."""
+    return {
+        'count': 10000,
+        'next': 'http://localhost/api/recipes/?page=2',
+        'previous': None,
+        'results': [{
+            'id': recipe_id,
+            'tags': [{
+                'id': tag_id,
+                'name': 'Завтрак',
+                'color': '#E26C2D',
+                'slug': 'breakfast',
+            } for tag_id in range(1, 3)],
+            'author': {
+                'email': f'user{recipe_id}@example.com',
+                'id': recipe_id,
+                'username': f'user_{recipe_id}',
+                'first_name': 'Иван',
+                'last_name': 'Петров',
+                'is_subscribed': False,
+            },
+            'ingredients': [{
+                'id': ingredient_id,
+                'name': 'абрикосовое варенье',
+                'measurement_unit': 'г',
+                'amount': 100,
+            } for ingredient_id in range(8)],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': f'Рецепт {recipe_id}',
+            'image': f'http://localhost/media/recipes/images/{recipe_id}.jpg',
+            'text': RECIPE_TEXT,
+            'cooking_time': 30,
+        } for recipe_id in range(size)],
+    }
+
+
+def ingredients_list():
+    with open(INGREDIENTS_FILE, encoding='utf-8') as file:
+        return [
+            {'id': ingredient_id, **ingredient}
+            for ingredient_id, ingredient in enumerate(json.load(file), 1)
+        ]
+
+
+def cpu_time(func, repeat):
+    """Среднее процессорное время вызова в миллисекундах."""
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает рендеринг JSON и сжатие ответов по байтам и CPU.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        payloads = {
+            'recipes page (100)': recipes_page(),
+            f'ingredients ({len(ingredients_list())})': ingredients_list(),
+        }
+        for title, data in payloads.items():
+            print(f'\n{title}')
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                ms = cpu_time(lambda: renderer.render(data), repeat)
+                print(f'  {type(renderer).__name__:<16} {ms:8.3f} ms')
+            content = ORJSONRenderer().render(data)
+            print(f'  {"identity":<16} {len(content):8d} B')
+            for encoding, precompressed in (
+                ('gzip', False), ('br', False), ('br', True),
+            ):
+                ms = cpu_time(
+                    lambda: compress(content, encoding, precompressed),
+                    max(repeat // 10, 1),
+                )
+                size = len(compress(content, encoding, precompressed))
+                label = encoding + (' (cached)' if precompressed else '')
+                print(f'  {label:<16} {size:8d} B {ms:8.3f} ms')
@@ -0,0 +1,139 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, Q
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.fast_serializers import (FastIngredientSerializer,
+                                  FastRecipeReadSerializer,
+                                  FastRecipeShortSerializer,
+                                  FastSubscriptionSerializer,
+                                  FastTagSerializer)
+from api.serializers import (IngredientSerializer, RecipeReadSerializer,
+                             RecipeShortSerializer, SubscriptionSerializer,
+                             TagSerializer)
+from api.views import RecipeViewSet
+from core.renderers import ORJSONRenderer
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+RECIPE_QUERIES = (
+    '',
+    'fields=id,name,author,tags',
+    'omit=text,ingredients',
+    'preset=compact',
+    'preset=compact&expand=author',
+    'expand=',
+)
+SUBSCRIPTION_QUERIES = ('', 'recipes_limit=2', 'omit=recipes')
+
+
+def make_request(query, user):
+    request = APIRequestFactory().get(f'/api/?{query}')
+    if user is not None:
+        force_authenticate(request, user)
+    return Request(request)
+
+
+def recipes_page(request, size):
+    view = RecipeViewSet(action='list', kwargs={}, format_kwarg=None)
+    view.request = request
+    return list(view.filter_queryset(view.get_queryset())[:size])
+
+
+def subscriptions(user):
+    return list(User.objects.filter(
+        is_active=True, author_in_subscription__user=user
+    ).annotate(recipes_count=Count('recipe_author', filter=Q(
+        recipe_author__pending_deletion=False
+    ))))
+
+
+def cpu_time(func, repeat):
+    """Среднее процессорное время вызова в миллисекундах."""
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = ('Сверяет вывод быстрых сериализаторов с DRF по байтам '
+            'на данных базы и сравнивает их скорость.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        cases = list(self.cases(options['page_size']))
+        if not cases:
+            raise CommandError('В базе нет рецептов для сравнения.')
+        renderer = ORJSONRenderer()
+        mismatches = 0
+        for title, drf, drf_items, fast, items, many, context in cases:
+            expected = renderer.render(
+                drf(drf_items, many=many, context=context()).data
+            )
+            actual = renderer.render(
+                fast(items, many=many, context=context()).data
+            )
+            if expected != actual:
+                mismatches += 1
+                print(f'РАЗЛИЧИЕ {title}:\n  DRF:  {expected[:300]}\n'
+                      f'  fast: {actual[:300]}')
+        print(f'Сверено {len(cases)} случаев, различий {mismatches}.')
+        if mismatches:
+            raise CommandError('Вывод быстрых сериализаторов отличается.')
+        print(f'\n{"case":<48} {"DRF ms":>9} {"fast ms":>9} {"x":>6}')
+        for title, drf, drf_items, fast, items, many, context in cases:
+            drf_ms, fast_ms = (
+                cpu_time(
+                    lambda serializer=serializer, items=items: serializer(
+                        items, many=many, context=context()
+                    ).data,
+                    options['repeat'],
+                )
+                for serializer, items in ((drf, drf_items), (fast, items))
+            )
+            print(f'{title:<48} {drf_ms:>9.3f} {fast_ms:>9.3f} '
+                  f'{drf_ms / fast_ms:>6.1f}')
+
+    @staticmethod
+    def cases(page_size):
+        """(название, DRF и его объекты, быстрый и его объекты, many,
+        фабрика контекста)."""
+        subscriber = User.objects.annotate(
+            count=Count('subscriber_user')
+        ).order_by('-count').first()
+        for user in (None, subscriber):
+            who = 'anonymous' if user is None else 'user'
+            for query in RECIPE_QUERIES:
+                request = make_request(query, user)
+                page = recipes_page(request, page_size)
+                if not page:
+                    return
+                context = (lambda request=request: {'request': request})
+                yield (f'recipes {who} ?{query}', RecipeReadSerializer, page,
+                       FastRecipeReadSerializer, page, True, context)
+                yield (f'recipe {who} ?{query}', RecipeReadSerializer,
+                       page[0], FastRecipeReadSerializer, page[0], False,
+                       context)
+            if user is not None:
+                authors = subscriptions(user)
+                for query in SUBSCRIPTION_QUERIES:
+                    request = make_request(query, user)
+                    yield (f'subscriptions ?{query}', SubscriptionSerializer,
+                           authors, FastSubscriptionSerializer, authors, True,
+                           lambda request=request: {'request': request})
+        yield ('recipe short', RecipeShortSerializer, page[0],
+               FastRecipeShortSerializer, page[0], False, dict)
+        for serializer, fast, model in (
+            (TagSerializer, FastTagSerializer, Tag),
+            (IngredientSerializer, FastIngredientSerializer, Ingredient),
+        ):
+            objects = list(model.objects.all())
+            rows = list(model.objects.values(*serializer.Meta.fields))
+            yield (f'{model._meta.model_name} values()', serializer, objects,
+                   fast, rows, True, dict)
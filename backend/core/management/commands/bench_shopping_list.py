@@ -0,0 +1,130 @@
+import multiprocessing
+import queue
+import resource
+import time
+
+from django.core.management import BaseCommand
+
+from core.shopping_list import SHOPPING_LIST_RENDERERS
+
+CART_SIZES = (10, 100, 500, 2000)
+MEASURE_TIMEOUT = 10 * 60
+
+
+def shopping_list(size):
+    return [
+        (f'ингредиент номер {line}', line % 500 + 1, 'г')
+        for line in range(size)
+    ]
+
+
+def rss():
+    """(текущий, пиковый) RSS процесса в КиБ.
+
+    RSS учитывает и память cairo и pango, которую не видит tracemalloc.
+    Без /proc пик берётся из getrusage и не сбрасывается.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            fields = dict(line.split(':', 1) for line in status)
+        return int(fields['VmRSS'].split()[0]), int(
+            fields['VmHWM'].split()[0]
+        )
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def measure(renderer_class, size, results):
+    """Прогон в отдельном процессе: пик RSS не смешивается с прошлыми.
+
+    Первый рендеринг загружает библиотеку и шрифты, его память
+    показывается отдельно как база. В results кладётся пара
+    (статус, данные); ошибки передаются строкой, так как не всякое
+    исключение переживает pickle.
+    """
+    try:
+        renderer = renderer_class()
+        renderer.render(shopping_list(1))
+    except Exception as error:
+        results.put(('unavailable', str(error)))
+        return
+    try:
+        ingredients = shopping_list(size)
+        base, _ = rss()
+        reset_peak_rss()
+        started = time.perf_counter()
+        renderer.render(ingredients)
+        elapsed = (time.perf_counter() - started) * 1000
+        results.put(('ok', (elapsed, base, rss()[1] - base)))
+    except Exception as error:
+        results.put(('failed', repr(error)))
+
+
+def wait_result(process, results, timeout):
+    """Результат прогона или None, если процесс умер молча или завис.
+
+    Живость проверяется до чтения очереди: умерший процесс уже
+    дописал в неё всё, что успел.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        alive = process.is_alive()
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not alive:
+                return None
+            if time.monotonic() > deadline:
+                process.kill()
+                return None
+
+
+class Command(BaseCommand):
+    help = ('Время и пиковая память (RSS) рендеринга списка покупок '
+            'в PDF каждым рендерером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=CART_SIZES
+        )
+        parser.add_argument(
+            '--timeout', type=int, default=MEASURE_TIMEOUT,
+            help='Секунд на один прогон, после них процесс убивается.',
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        print(f'{"renderer":<12} {"lines":>6} {"ms":>10} '
+              f'{"base RSS KiB":>13} {"peak +KiB":>10}')
+        for name, renderer_class in SHOPPING_LIST_RENDERERS.items():
+            for size in options['sizes']:
+                results = context.Queue()
+                process = context.Process(
+                    target=measure, args=(renderer_class, size, results)
+                )
+                process.start()
+                result = wait_result(process, results, options['timeout'])
+                process.join()
+                if result is None:
+                    print(f'{name:<12} {size:>6} нет результата, '
+                          f'код выхода {process.exitcode}')
+                    continue
+                state, data = result
+                if state == 'unavailable':
+                    print(f'{name:<12} недоступен: {data}')
+                    break
+                if state == 'failed':
+                    print(f'{name:<12} {size:>6} ошибка: {data}')
+                    continue
+                elapsed, base, peak = data
+                print(f'{name:<12} {size:>6} {elapsed:>10.1f} '
+                      f'{base:>13} {peak:>10}')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import BaseCommand
+
+from core.throttling import BUCKET_STORES
+
+
+class Command(BaseCommand):
+    help = 'Накладные расходы одной проверки TokenBucketThrottle.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        for name, store_class in BUCKET_STORES.items():
+            try:
+                store = store_class()
+            except ImproperlyConfigured as error:
+                print(f'{name:<8} пропущен: {error}')
+                continue
+            key = f'throttle:bench:{name}'
+            store.consume(key, repeat, 1, 1)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                store.consume(key, repeat, 1, 1)
+            elapsed = (time.perf_counter() - started) / repeat * 10 ** 6
+            print(f'{name:<8} {elapsed:8.1f} us/check')
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.constants import CHANGELOG_RETENTION_DAYS, DELETION_BATCH_SIZE
+from core.deletion import delete_batch
+from core.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи журнала изменений старше --days дней. '
+            'Клиенты с более старыми токенами получат full_resync.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=CHANGELOG_RETENTION_DAYS,
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DELETION_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        # Последняя старая запись остаётся: журнал не пустеет, и токен,
+        # выданный на ней, по-прежнему действителен.
+        floor = ChangeLog.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=options['days'])
+        ).order_by('-id').values_list('id', flat=True).first()
+        if floor is None:
+            print('Удалять нечего.')
+            return
+        expired = ChangeLog.objects.filter(id__lt=floor)
+        removed = 0
+        while True:
+            with transaction.atomic():
+                deleted = delete_batch(expired, True, options['batch_size'])
+            if not deleted:
+                break
+            removed += deleted
+        print(f'Удалено {removed} записей, токены меньше {floor - 1} '
+              'устарели.')
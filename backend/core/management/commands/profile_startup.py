@@ -0,0 +1,109 @@
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+# Выполняется в отдельном интерпретаторе с -X importtime: импорты
+# текущего процесса уже закешированы и не покажут ничего.
+STARTUP_SCRIPT = '''
+import json, resource, time
+started = time.perf_counter()
+from django.apps import config
+
+create = config.AppConfig.create.__func__
+ready_times = {}
+
+
+def timed_create(cls, entry):
+    app_config = create(cls, entry)
+    ready = app_config.ready
+
+    def timed_ready():
+        ready_started = time.perf_counter()
+        ready()
+        ready_times[app_config.label] = time.perf_counter() - ready_started
+
+    app_config.ready = timed_ready
+    return app_config
+
+
+config.AppConfig.create = classmethod(timed_create)
+phases = {}
+mark = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+phases['django.setup и middleware'] = time.perf_counter() - mark
+mark = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+phases['URLconf'] = time.perf_counter() - mark
+print(json.dumps({
+    'total': time.perf_counter() - started,
+    'phases': phases,
+    'ready': ready_times,
+    'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """Строки -X importtime: (модуль, собственное и общее время в мкс)."""
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split(
+            '|'
+        )
+        yield module.strip(), int(self_us), int(cumulative_us)
+
+
+class Command(BaseCommand):
+    help = ('Профиль запуска воркера: фазы, ready() приложений, '
+            'пакеты и модули, дольше всего импортирующиеся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        )
+        report = json.loads(process.stdout.splitlines()[-1])
+        imports = list(parse_importtime(process.stderr))
+        packages = defaultdict(int)
+        for module, self_us, _ in imports:
+            packages[module.split('.')[0]] += self_us
+        print(f'Запуск: {report["total"] * 1000:.0f} мс, '
+              f'пиковая память {report["maxrss_kib"] / 1024:.1f} МБ, '
+              f'модулей импортировано {len(imports)}.')
+        self.table('Фазы', report['phases'].items(), 1000)
+        self.table(
+            'ready() приложений',
+            sorted(report['ready'].items(), key=lambda item: -item[1]),
+            1000,
+        )
+        self.table(
+            'Пакеты (собственное время модулей)',
+            sorted(packages.items(), key=lambda item: -item[1])[
+                :options['top']
+            ],
+            1 / 1000,
+        )
+        self.table(
+            'Модули (время с зависимостями)',
+            [(module, cumulative) for module, _, cumulative in sorted(
+                imports, key=lambda item: -item[2]
+            )[:options['top']]],
+            1 / 1000,
+        )
+
+    @staticmethod
+    def table(title, rows, scale):
+        print(f'\n{title}:')
+        for name, value in rows:
+            print(f'  {name:<48} {value * scale:>9.1f} мс')
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from api.urls import router_v1
+from core.response_cache import CompressedResponseCacheMixin, get_stats
+
+
+class Command(BaseCommand):
+    help = 'Попадания в кеш ответов и сэкономленное время по вьюхам.'
+
+    def handle(self, *args, **options):
+        print(f'{"view":<12} {"hits":>8} {"waits":>8} {"misses":>8} '
+              f'{"hit rate":>9} {"saved s":>9}')
+        for _, viewset, basename in router_v1.registry:
+            if not issubclass(viewset, CompressedResponseCacheMixin):
+                continue
+            stats = get_stats(basename)
+            print(f'{basename:<12} {stats["hits"]:>8} {stats["waits"]:>8} '
+                  f'{stats["misses"]:>8} {stats["hit_rate"]:>9.1%} '
+                  f'{stats["saved_ms"] / 1000:>9.1f}')
@@ -0,0 +1,46 @@
+from django.core.management import BaseCommand
+
+from core.constants import DELETION_BATCH_SIZE
+from core.deletion import run_deletion_job
+from core.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = ('Удаляет поставленных в очередь пользователей и рецепты '
+            'пачками. Прерванные задачи продолжаются с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DELETION_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах.',
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Повторить задачи, завершившиеся ошибкой.',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [DeletionJob.PENDING, DeletionJob.RUNNING]
+        if options['retry_failed']:
+            statuses.append(DeletionJob.FAILED)
+        jobs = DeletionJob.objects.filter(
+            status__in=statuses
+        ).select_related('content_type')
+        for job in jobs:
+            print(f'{job.object_repr}: начато, '
+                  f'уже удалено {job.deleted_rows} строк.')
+
+            def progress(step, deleted, job=job):
+                print(f'  {step}: -{deleted}')
+
+            try:
+                job = run_deletion_job(
+                    job, options['batch_size'], options['pause'], progress
+                )
+            except Exception as error:
+                print(f'{job.object_repr}: ошибка {error!r}.')
+                continue
+            print(f'{job.object_repr}: удалено {job.deleted_rows} строк.')
@@ -0,0 +1,196 @@
+import atexit
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from core.constants import METRICS_FLUSH_INTERVAL
+from core.sqlite import SharedSQLite
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, math.inf)
+RENDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+
+# Имя -> (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Время ответа по вьюхе и действию.', LATENCY_BUCKETS,
+    ),
+    'db_queries_per_request': (
+        'histogram', 'Число SQL-запросов на HTTP-запрос.', QUERY_BUCKETS,
+    ),
+    'shopping_list_render_seconds': (
+        'histogram', 'Время рендеринга списка покупок в PDF.', RENDER_BUCKETS,
+    ),
+    'foodgram_favorites_total': (
+        'counter', 'Добавления и удаления избранного.', None,
+    ),
+    'foodgram_cart_total': (
+        'counter', 'Добавления и удаления рецептов в корзине.', None,
+    ),
+    'foodgram_subscriptions_total': (
+        'counter', 'Подписки и отписки.', None,
+    ),
+    'foodgram_recipe_writes_total': (
+        'counter', 'Создание, изменение и удаление рецептов.', None,
+    ),
+}
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in sorted(labels.items())
+    )
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+class Metrics:
+    """Счётчики и гистограммы, общие для всех воркеров.
+
+    Значения копятся в памяти процесса, и фоновый поток раз
+    в METRICS_FLUSH_INTERVAL секунд прибавляет их к строкам файла
+    SQLite одной транзакцией, поэтому /metrics видит сумму по всем
+    воркерам без внешнего сервиса, а запросы не ждут блокировки файла.
+    Гистограмма хранится как набор счётчиков _bucket, _sum и _count.
+    Всё выключено, пока не задана настройка METRICS_ENABLED.
+    """
+
+    file = SharedSQLite(
+        'METRICS_SQLITE_PATH',
+        'CREATE TABLE IF NOT EXISTS metric ('
+        'name TEXT, labels TEXT, le TEXT, value REAL, '
+        'PRIMARY KEY (name, labels, le))',
+        timeout=1,
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(float)
+        self.flusher_pid = None
+
+    def start_flusher(self):
+        """Запускает фоновый сброс в текущем процессе.
+
+        Вызывается под self.lock. Поток, запущенный до fork, в дочернем
+        процессе не существует, поэтому запуск сверяется с pid.
+        """
+        if self.flusher_pid == os.getpid():
+            return
+        self.flusher_pid = os.getpid()
+        threading.Thread(
+            target=self.flush_periodically, name='metrics-flush', daemon=True
+        ).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось сбросить метрики.')
+
+    def inc(self, name, value=1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        with self.lock:
+            self.start_flusher()
+            self.pending[name, format_labels(labels), ''] += value
+
+    def observe(self, name, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        buckets = METRICS[name][2]
+        rendered = format_labels(labels)
+        with self.lock:
+            self.start_flusher()
+            for bound in buckets:
+                if value <= bound:
+                    self.pending[
+                        f'{name}_bucket', rendered, format_bound(bound)
+                    ] += 1
+            self.pending[f'{name}_sum', rendered, ''] += value
+            self.pending[f'{name}_count', rendered, ''] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def flush(self):
+        """Прибавляет накопленное к общему файлу.
+
+        Если файл занят дольше таймаута, значения остаются в памяти
+        до следующего сброса.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(float)
+        if not pending:
+            return
+        connection = self.file.connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending[key] += value
+            return
+        try:
+            connection.executemany(
+                'INSERT INTO metric VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (name, labels, le) '
+                'DO UPDATE SET value = value + excluded.value',
+                [(*key, value) for key, value in pending.items()],
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        self.flush()
+        rows = defaultdict(list)
+        for name, labels, le, value in self.file.connection().execute(
+            'SELECT name, labels, le, value FROM metric'
+        ):
+            rows[name].append((labels, le, value))
+        lines = []
+        for name, (kind, description, _) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            series = (
+                (f'{name}_bucket', f'{name}_sum', f'{name}_count')
+                if kind == 'histogram' else (name,)
+            )
+            for series_name in series:
+                for labels, le, value in sorted(
+                    rows[series_name],
+                    key=lambda row: (row[0], float(row[1] or 0)),
+                ):
+                    if le:
+                        labels = ','.join(filter(None, (labels, f'le="{le}"')))
+                    lines.append(f'{series_name}{{{labels}}} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+atexit.register(metrics.flush)
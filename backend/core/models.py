@@ -0,0 +1,139 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class DeletionJob(models.Model):
+    """Фоновое удаление объекта с большим каскадом.
+
+    Объект скрывается при постановке в очередь, а зависимые строки
+    удаляет пачками команда run_deletion_jobs.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    content_type = models.ForeignKey(
+        ContentType,
+        verbose_name='Тип объекта',
+        on_delete=models.CASCADE,
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='id объекта',
+    )
+    target = GenericForeignKey('content_type', 'object_id')
+    object_repr = models.CharField(
+        verbose_name='Объект',
+        max_length=200,
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+    )
+    step = models.CharField(
+        verbose_name='Текущий шаг',
+        max_length=100,
+        blank=True,
+    )
+    deleted_rows = models.PositiveBigIntegerField(
+        verbose_name='Удалено строк',
+        default=0,
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Обновлено',
+        auto_now=True,
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Задача удаления'
+        verbose_name_plural = 'Задачи удаления'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('content_type', 'object_id'),
+                name='unique_deletion_job',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.object_repr}: {self.get_status_display()}'
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений для инкрементальной синхронизации клиентов.
+
+    Строки только добавляются, в той же транзакции, что и изменение,
+    а старые удаляет команда compact_changelog. id записи служит
+    токеном синхронизации. user_id - владелец записи об избранном,
+    корзине или подписке; у рецептов он пуст, их видят все.
+    """
+
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    CART = 'cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (CART, 'Корзина'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = (
+        (CREATE, 'Создание'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(
+        verbose_name='Тип объекта',
+        max_length=12,
+        choices=KINDS,
+    )
+    action = models.CharField(
+        verbose_name='Действие',
+        max_length=6,
+        choices=ACTIONS,
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='id рецепта или автора',
+    )
+    user_id = models.PositiveBigIntegerField(
+        verbose_name='id пользователя',
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Время',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Запись журнала изменений'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        return f'{self.id}: {self.kind} {self.object_id} {self.action}'
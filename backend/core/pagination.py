@@ -1,13 +1,209 @@
+import hashlib
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from core.constants import (COUNT_CACHE_TIMEOUT, ESTIMATE_MIN_ROWS,
+                            default_limit, max_limit, max_page_size,
+                            page_size)
+
+COUNT_CACHE_KEY = 'count:{signature}'
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+COUNT_NONE = 'none'
+# Постоянные условия выборок, отсекающие малую долю строк таблицы:
+# рецепты и пользователи в очереди на удаление (core.deletion).
+ESTIMATE_IGNORED_FILTERS = {
+    ('recipes.Recipe', 'pending_deletion'): False,
+    ('users.User', 'is_active'): True,
+}
+
+
+def is_ignored_filter(condition, alias):
+    if not isinstance(condition, Exact) or not isinstance(
+        condition.lhs, Col
+    ) or condition.lhs.alias != alias:
+        return False
+    field = condition.lhs.target
+    key = field.model._meta.label, field.name
+    return key in ESTIMATE_IGNORED_FILTERS and (
+        ESTIMATE_IGNORED_FILTERS[key] == condition.rhs
+    )
+
+
+def has_ignored_filters_only(query):
+    """Все условия выборки - из ESTIMATE_IGNORED_FILTERS."""
+    where = query.where
+    if where.negated or where.connector != AND:
+        return False
+    return all(
+        is_ignored_filter(child, query.base_table)
+        for child in where.children
+    )
+
+
+def planner_estimate(queryset):
+    """Оценка числа строк таблицы из статистики PostgreSQL.
+
+    Годится только для выборки без условий, кроме скрывающих очередь
+    на удаление: JOIN-ы select_related по обязательным внешним ключам
+    и аннотации число строк не меняют. None, если оценки нет или
+    таблица слишком мала, чтобы экономить.
+    """
+    query = queryset.query
+    connection = connections[queryset.db]
+    if (
+        connection.vendor != 'postgresql'
+        or not has_ignored_filters_only(query)
+        or query.distinct
+        or query.combinator
+        or query.group_by is not None
+    ):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < ESTIMATE_MIN_ROWS:
+        return None
+    return row[0]
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """Paginator, кеширующий COUNT(*) по SQL выборки.
+
+    Одинаково отфильтрованные выборки получают один ключ, счётчик
+    живёт COUNT_CACHE_TIMEOUT секунд.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        sql, params = self.object_list.query.sql_with_params()
+        signature = hashlib.sha256(
+            repr((self.object_list.db, sql, params)).encode()
+        ).hexdigest()
+        key = COUNT_CACHE_KEY.format(signature=signature)
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
 
-from core.constants import default_limit, max_limit, max_page_size, page_size
+
+class UncountedPage:
+    """Страница, о следующей странице которой известно по лишней строке."""
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
 
 
 class CustomPagination(pagination.PageNumberPagination):
+    """Постраничный вывод с тремя режимами поля count.
+
+    exact - точное число объектов, COUNT(*) кешируется по SQL выборки
+    на COUNT_CACHE_TIMEOUT секунд, поэтому может отставать на это время.
+    estimated - выборка без фильтров (кроме ESTIMATE_IGNORED_FILTERS)
+    по таблице от ESTIMATE_MIN_ROWS строк в PostgreSQL: count берётся
+    из статистики планировщика, в ответе есть count_estimated: true.
+    none - при ?count=false поля count нет вовсе.
+    В режимах estimated и none next определяется по лишней строке
+    страницы, а не по count, поэтому всегда точен.
+    """
+
     page_size = page_size
     page_query_param = 'page'
     page_size_query_param = 'limit'
     max_page_size = max_page_size
+    count_query_param = 'count'
+    django_paginator_class = CachedCountPaginator
+
+    def get_count_mode(self, queryset, request):
+        if request.query_params.get(self.count_query_param, '').lower() in (
+            '0', 'false'
+        ):
+            return COUNT_NONE, None
+        if isinstance(queryset, QuerySet):
+            estimate = planner_estimate(queryset)
+            if estimate is not None:
+                return COUNT_ESTIMATED, estimate
+        return COUNT_EXACT, None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode, self.estimate = self.get_count_mode(
+            queryset, request
+        )
+        if self.count_mode == COUNT_EXACT:
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number, message='Неверный номер страницы.'
+            ))
+        offset = (number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and number > 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number, message='Страница пуста.'
+            ))
+        self.page = UncountedPage(
+            rows[:page_size], number, len(rows) > page_size
+        )
+        self.request = request
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.count_mode == COUNT_EXACT:
+            return super().get_paginated_response(data)
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count_mode == COUNT_ESTIMATED:
+            fields[:0] = [
+                ('count', self.estimate), ('count_estimated', True)
+            ]
+        return Response(OrderedDict(fields))
 
 
 class CartPagination(pagination.LimitOffsetPagination):
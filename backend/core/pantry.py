@@ -0,0 +1,111 @@
+import threading
+from collections import defaultdict, namedtuple
+
+from core.generations import RECIPES_GENERATION, get_generation
+from recipes.models import RecipeIngredientAmount
+
+PantryMatch = namedtuple('PantryMatch', ('recipe_id', 'coverage', 'missing'))
+
+INDEX_CHUNK_SIZE = 5000
+
+
+def positions_to_bitset(positions):
+    """Собирает битсет из списка позиций за один проход."""
+    bits = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bits[position // 8] |= 1 << (position % 8)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_bits(bitset):
+    """Позиции установленных битов по возрастанию."""
+    binary = bin(bitset)[:1:-1]
+    position = binary.find('1')
+    while position != -1:
+        yield position
+        position = binary.find('1', position + 1)
+
+
+class PantryIndex:
+    """Инвертированный индекс «ингредиент -> битсет рецептов».
+
+    Каждому рецепту назначается позиция бита. Индекс живёт в памяти
+    воркера и перестраивается, когда сдвигается поколение рецептов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.snapshot = ((), (), {})
+
+    def refresh(self):
+        generation = get_generation(RECIPES_GENERATION)
+        if generation == self.generation:
+            return
+        with self.lock:
+            if generation != self.generation:
+                self.build(generation)
+
+    def build(self, generation):
+        positions = {}
+        sizes = []
+        postings = defaultdict(list)
+        rows = RecipeIngredientAmount.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator(chunk_size=INDEX_CHUNK_SIZE)
+        for recipe_id, ingredient_id in rows:
+            position = positions.setdefault(recipe_id, len(positions))
+            if position == len(sizes):
+                sizes.append(0)
+            sizes[position] += 1
+            postings[ingredient_id].append(position)
+        self.snapshot = (
+            tuple(positions),
+            tuple(sizes),
+            {
+                ingredient_id: positions_to_bitset(recipe_positions)
+                for ingredient_id, recipe_positions in postings.items()
+            },
+        )
+        self.generation = generation
+
+    def match(self, ingredient_ids, max_missing=None):
+        """Рецепты, в которых есть хотя бы один ингредиент из набора.
+
+        Совпадения считаются поразрядным сложением битсетов: в counters[k]
+        лежит k-й бит счётчика совпавших ингредиентов для каждого рецепта.
+        Результат упорядочен по доле покрытия и числу недостающих.
+        """
+        self.refresh()
+        recipe_ids, sizes, postings = self.snapshot
+        counters = []
+        for ingredient_id in set(ingredient_ids):
+            carry = postings.get(ingredient_id, 0)
+            for bit, counter in enumerate(counters):
+                if not carry:
+                    break
+                counters[bit], carry = counter ^ carry, counter & carry
+            if carry:
+                counters.append(carry)
+        candidates = 0
+        for counter in counters:
+            candidates |= counter
+        matches = []
+        for position in iter_bits(candidates):
+            found = sum(
+                ((counter >> position) & 1) << bit
+                for bit, counter in enumerate(counters)
+            )
+            missing = sizes[position] - found
+            if max_missing is not None and missing > max_missing:
+                continue
+            matches.append(PantryMatch(
+                recipe_ids[position], found / sizes[position], missing
+            ))
+        matches.sort(key=lambda match: (
+            -match.coverage, match.missing, match.recipe_id
+        ))
+        return matches
+
+
+pantry_index = PantryIndex()
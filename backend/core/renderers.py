@@ -0,0 +1,28 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson.
+
+    Вывод совпадает с компактным JSON стандартного рендерера. Типы,
+    которых нет в orjson (Decimal, ленивые строки), передаются
+    кодировщику DRF. Запросы с отступами обрабатывает родительский класс.
+    """
+
+    encoder_default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        return orjson.dumps(
+            data, default=self.encoder_default, option=ORJSON_OPTIONS
+        )
@@ -0,0 +1,170 @@
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+
+from core.constants import (RESPONSE_CACHE_LOCK_TIMEOUT,
+                            RESPONSE_CACHE_TIMEOUT, RESPONSE_CACHE_WAIT)
+from core.generations import get_generation
+from core.middleware import choose_encoding, compress, set_content_encoding
+
+RESPONSE_CACHE_KEY = 'response:{generation}:{encoding}:{path}'
+RESPONSE_CACHE_LOCK = '{key}:lock'
+RESPONSE_CACHE_STAT = 'response_cache:{name}:{stat}'
+RESPONSE_CACHE_STATS = ('hits', 'misses', 'waits', 'miss_ms')
+
+
+def normalize_query(query_params):
+    """Строка запроса с отсортированными параметрами без пустых значений.
+
+    Запросы, отличающиеся только порядком параметров, получают один
+    ключ кеша.
+    """
+    return urlencode(sorted(
+        (name, value)
+        for name in query_params
+        for value in query_params.getlist(name) if value
+    ))
+
+
+def incr_stat(name, stat, delta=1):
+    key = RESPONSE_CACHE_STAT.format(name=name, stat=stat)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def get_stats(name):
+    """Счётчики кеша ответов вьюхи и оценка сэкономленного времени."""
+    keys = {
+        RESPONSE_CACHE_STAT.format(name=name, stat=stat): stat
+        for stat in RESPONSE_CACHE_STATS
+    }
+    stats = dict.fromkeys(RESPONSE_CACHE_STATS, 0)
+    stats.update({
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    })
+    served = stats['hits'] + stats['waits']
+    requests = served + stats['misses']
+    stats['hit_rate'] = served / requests if requests else 0
+    stats['saved_ms'] = (
+        served * stats['miss_ms'] / stats['misses'] if stats['misses'] else 0
+    )
+    return stats
+
+
+class CompressedResponseCacheMixin:
+    """Кеширует готовые сжатые JSON-ответы list и retrieve.
+
+    Повторный запрос отдаётся из кеша без запросов к базе,
+    сериализации и сжатия. Ответ устаревает вместе с поколениями
+    данных response_cache_generation (имя или кортеж имён). Если ответ
+    зависит от пользователя, response_cache_anonymous_only ограничивает
+    кеш анонимными запросами. Ответы, которые часто устаревают,
+    ставят response_cache_precompressed = False и сжимаются так же
+    быстро, как некешируемые: сжатие попадает на промах под замком.
+
+    Промах вычисляет один запрос: он держит замок, а параллельные
+    запросы с тем же ключом ждут его ответ до RESPONSE_CACHE_WAIT
+    секунд. Попадания, промахи и время промахов считаются в кеше,
+    их показывает команда response_cache_stats.
+    """
+
+    response_cache_generation = None
+    response_cache_anonymous_only = False
+    response_cache_timeout = RESPONSE_CACHE_TIMEOUT
+    response_cache_precompressed = True
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request, encoding):
+        names = self.response_cache_generation
+        if isinstance(names, str):
+            names = (names,)
+        return RESPONSE_CACHE_KEY.format(
+            generation='.'.join(str(get_generation(name)) for name in names),
+            encoding=encoding or 'identity',
+            path=f'{request.path}?{normalize_query(request.query_params)}',
+        )
+
+    def is_response_cacheable(self, request):
+        return request.accepted_renderer.format == 'json' and not (
+            self.response_cache_anonymous_only
+            and request.user.is_authenticated
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        key = self.get_response_cache_key(request, encoding)
+        cached = cache.get(key)
+        if cached is not None:
+            incr_stat(self.basename, 'hits')
+        else:
+            cached = self.wait_for_response(key)
+        if cached is None:
+            request.response_cache = (key, encoding, time.perf_counter())
+            return handler(request, *args, **kwargs)
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        patch_vary_headers(response, ('Accept',))
+        return set_content_encoding(response, encoding)
+
+    def wait_for_response(self, key):
+        """Берёт замок на вычисление ответа или ждёт чужой ответ.
+
+        Возвращает None, если ответ нужно вычислить самому.
+        """
+        lock = RESPONSE_CACHE_LOCK.format(key=key)
+        deadline = time.monotonic() + RESPONSE_CACHE_WAIT
+        while not cache.add(lock, 1, RESPONSE_CACHE_LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.02)
+            cached = cache.get(key)
+            if cached is not None:
+                incr_stat(self.basename, 'waits')
+                return cached
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(request, 'response_cache', None) is None:
+            return response
+        key, encoding, started = request.response_cache
+        try:
+            if response.status_code != 200:
+                return response
+            response.render()
+            if encoding:
+                response.content = compress(
+                    response.content, encoding,
+                    precompressed=self.response_cache_precompressed,
+                )
+            cache.set(
+                key,
+                (response.content, response['Content-Type']),
+                self.response_cache_timeout,
+            )
+        finally:
+            cache.delete(RESPONSE_CACHE_LOCK.format(key=key))
+        incr_stat(self.basename, 'misses')
+        incr_stat(self.basename, 'miss_ms', round(
+            (time.perf_counter() - started) * 1000
+        ))
+        return set_content_encoding(response, encoding)
@@ -0,0 +1,104 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import dateformat, timezone
+
+DATE_FORMAT = 'd.m.Y G:i'
+# Пунктов в миллиметре и формат A4 в пунктах, как в reportlab.lib:
+# сам ReportLab, как и WeasyPrint, импортируется только при рендеринге.
+MM = 72 / 25.4
+A4 = (210 * MM, 297 * MM)
+
+
+class ShoppingListRenderer:
+    """Базовый рендерер списка покупок в PDF.
+
+    ingredients - последовательность строк (название, количество,
+    единица измерения).
+    """
+
+    def render(self, ingredients):
+        raise NotImplementedError
+
+
+class WeasyPrintRenderer(ShoppingListRenderer):
+    """Вёрстка HTML-шаблона списка покупок через WeasyPrint."""
+
+    template_name = 'cart/shop_list.html'
+
+    def render(self, ingredients):
+        from weasyprint import HTML
+
+        html_template = render_to_string(
+            self.template_name, {'ingredients': ingredients}
+        )
+        return HTML(string=html_template).write_pdf()
+
+
+class ReportLabRenderer(ShoppingListRenderer):
+    """Список покупок в одну колонку, нарисованный напрямую ReportLab."""
+
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    title_size = 18
+    line_height = 7 * MM
+    margin = 20 * MM
+    box_size = 3.5 * MM
+
+    def __init__(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_FONT)
+            )
+
+    def render(self, ingredients):
+        from reportlab.pdfgen.canvas import Canvas
+
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        width, height = A4
+        canvas.setFont(self.font_name, self.title_size)
+        canvas.drawString(self.margin, height - self.margin, 'Список покупок')
+        y = height - self.margin - 2 * self.line_height
+        canvas.setFont(self.font_name, self.font_size)
+        for name, amount, measurement_unit in ingredients:
+            if y < self.margin + self.line_height:
+                canvas.showPage()
+                canvas.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            canvas.rect(
+                self.margin, y - 0.5 * MM, self.box_size, self.box_size
+            )
+            canvas.drawString(
+                self.margin + 2 * self.box_size, y,
+                f'{name} - {amount} {measurement_unit}'
+            )
+            y -= self.line_height
+        canvas.drawString(
+            self.margin, max(y - self.line_height, self.margin),
+            'Дата создания '
+            + dateformat.format(timezone.localtime(), DATE_FORMAT)
+        )
+        canvas.save()
+        return buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = {
+    'weasyprint': WeasyPrintRenderer,
+    'reportlab': ReportLabRenderer,
+}
+
+
+def get_shopping_list_renderer(name=None):
+    """Рендерер по имени, по умолчанию - из настройки SHOPPING_LIST_RENDERER.
+
+    Неизвестное имя считается отсутствующим.
+    """
+    renderer_class = SHOPPING_LIST_RENDERERS.get(
+        name, SHOPPING_LIST_RENDERERS[settings.SHOPPING_LIST_RENDERER]
+    )
+    return renderer_class()
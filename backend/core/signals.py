@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.metrics import metrics
+from recipes.models import Cart, FavoriteRecipe, Recipe
+from users.models import Subscription
+
+DOMAIN_COUNTERS = {
+    FavoriteRecipe: 'foodgram_favorites_total',
+    Cart: 'foodgram_cart_total',
+    Subscription: 'foodgram_subscriptions_total',
+}
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Subscription)
+def domain_object_saved(sender, created, **kwargs):
+    if created:
+        metrics.inc(DOMAIN_COUNTERS[sender], action='add')
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Subscription)
+def domain_object_deleted(sender, **kwargs):
+    metrics.inc(DOMAIN_COUNTERS[sender], action='remove')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(created, raw, **kwargs):
+    if not raw:
+        metrics.inc(
+            'foodgram_recipe_writes_total',
+            action='create' if created else 'update',
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(**kwargs):
+    metrics.inc('foodgram_recipe_writes_total', action='delete')
@@ -0,0 +1,32 @@
+import sqlite3
+import threading
+
+from django.conf import settings
+
+
+class SharedSQLite:
+    """Файл SQLite, общий для воркеров одной машины.
+
+    У каждого потока своё соединение в режиме autocommit, транзакции
+    открываются явно. Журнал WAL без fsync: читатели не ждут писателя,
+    а потеря последних записей при сбое питания допустима.
+    """
+
+    def __init__(self, path_setting, schema, timeout):
+        self.path_setting = path_setting
+        self.schema = schema
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        if not hasattr(self.local, 'connection'):
+            connection = sqlite3.connect(
+                getattr(settings, self.path_setting),
+                timeout=self.timeout,
+                isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(self.schema)
+            self.local.connection = connection
+        return self.local.connection
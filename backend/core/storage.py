@@ -0,0 +1,44 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 содержимого.
+
+    Одинаковые байты сохраняются один раз, а имя файла никогда не
+    меняет содержимое, поэтому файлы можно отдавать с вечным кешем.
+    Файл сначала пишется под временным именем и атомарно переносится,
+    так что параллельная загрузка той же картинки ничего не ломает.
+    Повторная загрузка существующего файла обновляет его mtime:
+    clean_media не трогает файлы моложе льготного срока, и картинка,
+    снова понадобившаяся рецепту, не должна удалиться как сирота.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        temporary = super()._save(
+            self.get_available_name(f'{name}.part'), content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+recipe_images_storage = ContentAddressedStorage()
@@ -0,0 +1,191 @@
+import sqlite3
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.sqlite import SharedSQLite
+
+BUCKET_KEY = 'throttle:{scope}:{ident}'
+LOCK_ATTEMPTS = 50
+LOCK_TIMEOUT = 1
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# Бэкенды кеша, у которых add атомарен для всех воркеров.
+ATOMIC_ADD_CACHE_BACKENDS = (
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.memcached.MemcachedCache',
+    'django.core.cache.backends.redis.RedisCache',
+    'django_redis.cache.RedisCache',
+)
+BUCKETS_FILE = SharedSQLite(
+    'THROTTLE_SQLITE_PATH',
+    'CREATE TABLE IF NOT EXISTS bucket ('
+    'key TEXT PRIMARY KEY, tokens REAL, updated REAL)',
+    timeout=LOCK_TIMEOUT,
+)
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60), как в SimpleRateThrottle."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def take_tokens(tokens, updated, capacity, rate, cost, now):
+    """Пополняет ведро на момент now и пытается списать cost токенов.
+
+    Возвращает новое число токенов и время ожидания в секундах:
+    0, если запрос пропущен.
+    """
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+def cache_has_atomic_add():
+    return settings.CACHES['default']['BACKEND'] in ATOMIC_ADD_CACHE_BACKENDS
+
+
+def default_bucket_store():
+    """THROTTLE_STORE или, если не задан, cache при memcached и Redis
+    и sqlite при остальных бэкендах кеша."""
+    if settings.THROTTLE_STORE:
+        return settings.THROTTLE_STORE
+    return 'cache' if cache_has_atomic_add() else 'sqlite'
+
+
+class CacheBucketStore:
+    """Вёдра в кеше Django, общем для всех воркеров.
+
+    Чтение и запись ведра выполняются под коротким замком cache.add.
+    Если замок взять не удалось, запрос ограничивается: иначе ведро
+    не действовало бы как раз под нагрузкой. Замок помечен случайным
+    значением и снимается, только если всё ещё принадлежит этому
+    запросу, а не тому, кто взял его после LOCK_TIMEOUT.
+
+    Годится только для memcached и Redis (ATOMIC_ADD_CACHE_BACKENDS):
+    в файловом кеше add - проверка и запись без блокировки, и два
+    воркера могут взять замок одновременно, а отсев старых записей
+    сбрасывает вёдра.
+    """
+
+    def __init__(self):
+        if not cache_has_atomic_add():
+            raise ImproperlyConfigured(
+                'THROTTLE_STORE=cache требует memcached или Redis, '
+                f'а не {settings.CACHES["default"]["BACKEND"]}.'
+            )
+
+    def consume(self, key, capacity, rate, cost):
+        lock = f'{key}:lock'
+        token = uuid4().hex
+        for _ in range(LOCK_ATTEMPTS):
+            if cache.add(lock, token, LOCK_TIMEOUT):
+                break
+            time.sleep(0.001)
+        else:
+            return LOCK_TIMEOUT
+        try:
+            now = time.time()
+            tokens, updated = cache.get(key, (capacity, now))
+            tokens, wait = take_tokens(
+                tokens, updated, capacity, rate, cost, now
+            )
+            cache.set(key, (tokens, now), int(capacity / rate) + 1)
+            return wait
+        finally:
+            if cache.get(lock) == token:
+                cache.delete(lock)
+
+
+class SQLiteBucketStore:
+    """Вёдра в файле SQLite для запуска без общего кеша.
+
+    Ведро обновляется в транзакции BEGIN IMMEDIATE, поэтому воркеры
+    на одной машине не теряют списания друг друга. Если файл занят
+    дольше LOCK_TIMEOUT, запрос ограничивается.
+    """
+
+    def consume(self, key, capacity, rate, cost):
+        connection = BUCKETS_FILE.connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return LOCK_TIMEOUT
+        try:
+            now = time.time()
+            row = connection.execute(
+                'SELECT tokens, updated FROM bucket WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, wait = take_tokens(
+                *(row or (capacity, now)), capacity, rate, cost, now
+            )
+            connection.execute(
+                'INSERT OR REPLACE INTO bucket VALUES (?, ?, ?)',
+                (key, tokens, now),
+            )
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            self.rollback(connection)
+            return LOCK_TIMEOUT
+        except Exception:
+            self.rollback(connection)
+            raise
+        return wait
+
+    @staticmethod
+    def rollback(connection):
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+
+
+BUCKET_STORES = {
+    'cache': CacheBucketStore,
+    'sqlite': SQLiteBucketStore,
+}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ведро токенов с весом запроса для дорогих действий.
+
+    Вес берётся из throttle_costs вьюхи по имени действия, действия без
+    веса не ограничиваются. Бюджет задаётся в DEFAULT_THROTTLE_RATES
+    отдельно для анонимов (scope_anon, по IP) и пользователей
+    (scope_user): '30/min' - ведро на 30 токенов, которое полностью
+    пополняется за минуту.
+    """
+
+    scope = 'expensive'
+
+    def __init__(self):
+        self.store = BUCKET_STORES[default_bucket_store()]()
+        self.wait_seconds = 0
+
+    def get_budget(self, request):
+        if request.user.is_authenticated:
+            scope, ident = f'{self.scope}_user', request.user.pk
+        else:
+            scope, ident = f'{self.scope}_anon', self.get_ident(request)
+        capacity, duration = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES[scope]
+        )
+        return BUCKET_KEY.format(scope=scope, ident=ident), capacity, duration
+
+    def allow_request(self, request, view):
+        cost = getattr(view, 'throttle_costs', {}).get(view.action, 0)
+        if not cost:
+            return True
+        key, capacity, duration = self.get_budget(request)
+        self.wait_seconds = self.store.consume(
+            key, capacity, capacity / duration, min(cost, capacity)
+        )
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.constants import MAX_IMAGE_SIDE, MAX_IMAGE_SIZE
+
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF')
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = 413
+    default_detail = 'Файл слишком большой.'
+    default_code = 'request_entity_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы формы во временный файл, не держа их в памяти.
+
+    Запрос, заявленная длина которого заведомо больше лимита, отклоняется
+    до чтения тела, а файл обрывается на первом чанке сверх лимита.
+    """
+
+    max_size = MAX_IMAGE_SIZE
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > (
+            self.max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        ):
+            raise RequestEntityTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            raise RequestEntityTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class LimitedUploadMixin:
+    """Подключает LimitedTemporaryFileUploadHandler к запросам вьюхи."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+def check_image_header(file):
+    """Проверяет формат и размеры картинки по заголовку.
+
+    Pillow читает только заголовок, пиксели не декодируются, поэтому
+    слишком большая картинка отклоняется до того, как займёт память.
+    """
+    from PIL import Image
+
+    if file.size > MAX_IMAGE_SIZE:
+        raise ValidationError(
+            f'Размер файла больше {MAX_IMAGE_SIZE // 1024 ** 2} МБ.'
+        )
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Загрузите корректное изображение.')
+    finally:
+        file.seek(0)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError('Допустимы только JPEG, PNG и GIF.')
+    if max(width, height) > MAX_IMAGE_SIDE:
+        raise ValidationError(
+            f'Сторона картинки больше {MAX_IMAGE_SIDE} пикселей.'
+        )
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from core.metrics import metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics_view(request):
+    """Метрики всех воркеров в формате Prometheus.
+
+    Nginx не проксирует /metrics: Prometheus опрашивает backend напрямую.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,8 +52,29 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
+    'DEFAULT_THROTTLE_RATES': {
+        'expensive_anon': os.getenv('THROTTLE_EXPENSIVE_ANON', '30/min'),
+        'expensive_user': os.getenv('THROTTLE_EXPENSIVE_USER', '120/min'),
+    },
 }
 
+THROTTLE_STORE = os.getenv('THROTTLE_STORE')
+THROTTLE_SQLITE_PATH = os.getenv(
+    'THROTTLE_SQLITE_PATH', os.path.join(BASE_DIR, 'throttle.sqlite3')
+)
+
 DJOSER = {
     'SERIALIZERS': {
         'user_create': 'api.serializers.RegistrationUserCreateSerializer',
@@ -97,6 +120,18 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -134,5 +169,19 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_SQLITE_PATH = os.getenv(
+    'METRICS_SQLITE_PATH', os.path.join(BASE_DIR, 'metrics.sqlite3')
+)
+
+INGREDIENT_CATALOG_PATH = os.getenv(
+    'INGREDIENT_CATALOG_PATH', os.path.join(BASE_DIR, 'ingredient_catalog.bin')
+)
+
+SHOPPING_LIST_RENDERER = os.getenv('SHOPPING_LIST_RENDERER', 'weasyprint')
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,17 +1,50 @@
 from django.contrib import admin
 
-from recipes.models import (Cart, FavoriteRecipe, Ingredient, Recipe,
+from recipes.duplicates import index_recipes
+from recipes.models import (Cart, CartIngredient, FavoriteRecipe,
+                            Ingredient, Recipe, RecipeDuplicate,
                             RecipeIngredientAmount, Tag)
+from core.admin import DeferredDeletionAdmin, count_subquery, input_filter
+from core.changelog import log_change
+from core.models import ChangeLog
+
+UserInputFilter = input_filter('user', 'user__username', 'пользователю')
+RecipeInputFilter = input_filter(
+    'recipe', 'recipe__name__icontains', 'рецепту'
+)
+AuthorInputFilter = input_filter('author', 'author__username', 'автору')
 
 
 class RecipeIngredientAmountInline(admin.TabularInline):
     model = RecipeIngredientAmount
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
+
+class UsersRecipeAdmin(admin.ModelAdmin):
+    """Общая админ панель связей пользователя с рецептом."""
+
+    list_filter = (
+        UserInputFilter,
+        RecipeInputFilter,
+    )
+    list_select_related = (
+        'user',
+        'recipe__author',
+    )
+    autocomplete_fields = (
+        'user',
+        'recipe',
+    )
+    show_full_result_count = False
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(UsersRecipeAdmin):
     """Админ панель списка покупок."""
 
     list_display = (
@@ -20,10 +53,11 @@ class CartAdmin(admin.ModelAdmin):
         'get_ingredients',
         'add_to_shopping_cart_date',
     )
-    list_filter = (
-        'user',
-        'recipe',
-    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'recipe__ingredients'
+        )
 
     @admin.display(description='Ингредиенты')
     def get_ingredients(self, obj):
@@ -32,18 +66,32 @@ class CartAdmin(admin.ModelAdmin):
         )
 
 
-@admin.register(FavoriteRecipe)
-class FavoriteRecipeAdmin(admin.ModelAdmin):
-    """Админ панель избранных рецептов."""
+@admin.register(CartIngredient)
+class CartIngredientAdmin(UsersRecipeAdmin):
+    """Админ панель недостающих ингредиентов в списке покупок."""
 
     list_display = (
         'user',
         'recipe',
-        'add_to_favorite_date',
+        'ingredient',
+        'amount',
     )
-    list_filter = (
+    list_select_related = UsersRecipeAdmin.list_select_related + (
+        'ingredient',
+    )
+    autocomplete_fields = UsersRecipeAdmin.autocomplete_fields + (
+        'ingredient',
+    )
+
+
+@admin.register(FavoriteRecipe)
+class FavoriteRecipeAdmin(UsersRecipeAdmin):
+    """Админ панель избранных рецептов."""
+
+    list_display = (
         'user',
         'recipe',
+        'add_to_favorite_date',
     )
 
 
@@ -55,12 +103,11 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
     search_fields = ('name',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(DeferredDeletionAdmin):
     """Админ панель модели рецептов."""
 
     list_display = (
@@ -71,21 +118,43 @@ class RecipeAdmin(admin.ModelAdmin):
         'get_tags',
     )
     list_filter = (
-        'author__username',
-        'name',
+        AuthorInputFilter,
         'tags',
     )
     search_fields = (
         'name',
         'author__username',
-        'tags__name',
     )
     readonly_fields = (
         'in_favorite_count',
     )
+    autocomplete_fields = (
+        'author',
+        'tags',
+    )
     inlines = (
         RecipeIngredientAmountInline,
     )
+    show_full_result_count = False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        index_recipes([form.instance.pk])
+        log_change(
+            ChangeLog.RECIPE,
+            ChangeLog.UPDATE if change else ChangeLog.CREATE,
+            form.instance.pk,
+        )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            'ingredients',
+        ).annotate(
+            favorites_count=count_subquery(FavoriteRecipe, 'recipe'),
+        )
 
     @admin.display(description='Ингредиенты')
     def get_ingredients(self, obj):
@@ -99,9 +168,12 @@ class RecipeAdmin(admin.ModelAdmin):
             tag.name for tag in obj.tags.all()
         )
 
-    @admin.display(description='Кол-во добавлений')
+    @admin.display(
+        description='Кол-во добавлений',
+        ordering='favorites_count',
+    )
     def in_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(RecipeIngredientAmount)
@@ -113,6 +185,47 @@ class RecipeIngredientAmountAdmin(admin.ModelAdmin):
         'ingredient',
         'amount',
     )
+    list_select_related = (
+        'recipe__author',
+        'ingredient',
+    )
+    autocomplete_fields = (
+        'recipe',
+        'ingredient',
+    )
+    show_full_result_count = False
+
+
+@admin.register(RecipeDuplicate)
+class RecipeDuplicateAdmin(admin.ModelAdmin):
+    """Админ панель проверки возможных дублей рецептов."""
+
+    list_display = (
+        'recipe',
+        'original',
+        'similarity',
+        'status',
+        'found_at',
+    )
+    list_editable = (
+        'status',
+    )
+    list_filter = (
+        'status',
+    )
+    list_select_related = (
+        'recipe__author',
+        'original__author',
+    )
+    autocomplete_fields = (
+        'recipe',
+        'original',
+    )
+    readonly_fields = (
+        'similarity',
+        'found_at',
+    )
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -126,3 +239,7 @@ class TagAdmin(admin.ModelAdmin):
     list_filter = (
         'name',
     )
+    search_fields = (
+        'name',
+        'slug',
+    )
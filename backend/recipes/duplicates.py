@@ -0,0 +1,173 @@
+import hashlib
+import re
+import zlib
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from core.constants import (DUPLICATE_SIMILARITY, LSH_BANDS,
+                            MAX_DUPLICATE_CANDIDATES, MINHASH_PERMUTATIONS,
+                            SHINGLE_SIZE)
+from recipes.models import (Recipe, RecipeBucket, RecipeDuplicate,
+                            RecipeIngredientAmount, RecipeSignature)
+
+PRIME = (1 << 61) - 1
+WORD = re.compile(r'\w+')
+ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+
+def hash_coefficients(count):
+    """Коэффициенты a*x + b хеш-функций MinHash.
+
+    Выводятся из номера функции, а не из генератора случайных чисел:
+    подписи, посчитанные разными процессами и версиями Python, должны
+    оставаться сравнимыми.
+    """
+    return [
+        tuple(
+            int.from_bytes(hashlib.blake2b(
+                f'{name}{number}'.encode(), digest_size=8
+            ).digest(), 'big') % (PRIME - 1) + 1
+            for name in 'ab'
+        )
+        for number in range(count)
+    ]
+
+
+PERMUTATIONS = hash_coefficients(MINHASH_PERMUTATIONS)
+
+
+def recipe_tokens(name, text, ingredient_ids):
+    """Шинглы из SHINGLE_SIZE слов названия и описания и id ингредиентов.
+
+    Регистр, ё и знаки препинания не различаются, поэтому мелкие
+    правки текста меняют лишь несколько шинглов.
+    """
+    words = WORD.findall(f'{name} {text}'.lower().replace('ё', 'е'))
+    tokens = {
+        ' '.join(words[start:start + SHINGLE_SIZE])
+        for start in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+    tokens.update(f'#{pk}' for pk in ingredient_ids)
+    return tokens
+
+
+def minhash(tokens):
+    """Минимумы MINHASH_PERMUTATIONS хеш-функций по множеству токенов.
+
+    Доля совпавших позиций двух подписей оценивает коэффициент
+    Жаккара их множеств.
+    """
+    hashes = [zlib.crc32(token.encode()) for token in tokens]
+    return [
+        min((a * value + b) % PRIME for value in hashes)
+        for a, b in PERMUTATIONS
+    ]
+
+
+def similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def band_buckets(signature):
+    """(полоса, хеш) для LSH_BANDS полос подписи по ROWS значений.
+
+    Рецепты с совпавшей хотя бы одной полосой - кандидаты в дубли:
+    при сходстве 0.8 совпадение почти гарантировано, при 0.3 -
+    редкость.
+    """
+    return [
+        (band, int.from_bytes(hashlib.blake2b(
+            array('Q', signature[band * ROWS:(band + 1) * ROWS]).tobytes(),
+            digest_size=8,
+        ).digest(), 'big', signed=True))
+        for band in range(LSH_BANDS)
+    ]
+
+
+def load_signature(value):
+    signature = array('Q')
+    signature.frombytes(value)
+    return signature.tolist()
+
+
+def find_candidates(recipe_id, buckets):
+    """Рецепты, у которых совпала хотя бы одна полоса, самые близкие
+    первыми."""
+    query = Q()
+    for band, bucket in buckets:
+        query |= Q(band=band, bucket=bucket)
+    return list(RecipeBucket.objects.filter(
+        query, recipe__pending_deletion=False
+    ).exclude(recipe_id=recipe_id).order_by().values('recipe_id').annotate(
+        shared=Count('pk')
+    ).order_by('-shared').values_list('recipe_id', flat=True)[
+        :MAX_DUPLICATE_CANDIDATES
+    ])
+
+
+def index_recipes(recipe_ids):
+    """Пересчитывает подписи и корзины рецептов и ищет их дубли.
+
+    Сходство кандидатов из корзин уточняется по подписям, пары
+    не ниже DUPLICATE_SIMILARITY записываются в RecipeDuplicate: более
+    поздний рецепт - дубль более раннего. Уже рассмотренные пары
+    не трогаются. Возвращает {id рецепта: [(id похожего, сходство)]}.
+    """
+    ingredient_ids = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredientAmount.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values_list('recipe_id', 'ingredient_id'):
+        ingredient_ids[recipe_id].append(ingredient_id)
+    signatures = {
+        pk: minhash(recipe_tokens(name, text, ingredient_ids[pk]))
+        for pk, name, text in Recipe._base_manager.filter(
+            pk__in=recipe_ids
+        ).values_list('pk', 'name', 'text')
+    }
+    buckets = {pk: band_buckets(signature)
+               for pk, signature in signatures.items()}
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=signatures).delete()
+        RecipeSignature.objects.bulk_create(
+            RecipeSignature(
+                recipe_id=pk, minhash=array('Q', signature).tobytes()
+            )
+            for pk, signature in signatures.items()
+        )
+        RecipeBucket.objects.filter(recipe_id__in=signatures).delete()
+        RecipeBucket.objects.bulk_create(
+            RecipeBucket(recipe_id=pk, band=band, bucket=bucket)
+            for pk, recipe_buckets in buckets.items()
+            for band, bucket in recipe_buckets
+        )
+        found = {}
+        for pk, signature in signatures.items():
+            candidates = RecipeSignature.objects.filter(
+                recipe_id__in=find_candidates(pk, buckets[pk])
+            ).values_list('recipe_id', 'minhash')
+            found[pk] = sorted((
+                (other, score) for other, score in (
+                    (other, similarity(signature, load_signature(value)))
+                    for other, value in candidates
+                ) if score >= DUPLICATE_SIMILARITY
+            ), key=lambda pair: -pair[1])
+        pairs = {
+            (max(pk, other), min(pk, other)): score
+            for pk, recipe_pairs in found.items()
+            for other, score in recipe_pairs
+        }
+        RecipeDuplicate.objects.bulk_create(
+            (
+                RecipeDuplicate(
+                    recipe_id=recipe_id,
+                    original_id=original_id,
+                    similarity=score,
+                )
+                for (recipe_id, original_id), score in pairs.items()
+            ),
+            ignore_conflicts=True,
+        )
+    return found
@@ -0,0 +1,259 @@
+import orjson
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from core.changelog import log_changes
+from core.generations import (INGREDIENTS_GENERATION, RECIPES_GENERATION,
+                              bump_generation)
+from core.metrics import metrics
+from core.models import ChangeLog
+from recipes.models import (Ingredient, Recipe, RecipeIngredientAmount, Tag,
+                            tags_mask)
+from users.models import User
+
+
+RECORD_FIELDS = (
+    'author', 'name', 'text', 'image', 'cooking_time', 'tags', 'ingredients'
+)
+
+
+class RecipeRecordError(ValueError):
+    """Запись рецепта испорчена или ссылается на то, чего нет в базе."""
+
+
+def clean_value(model, field, value):
+    """Значение поля после проверок модели, которые bulk_create
+    не выполняет."""
+    try:
+        return model._meta.get_field(field).clean(value, None)
+    except ValidationError as error:
+        raise RecipeRecordError(f'{field}: {" ".join(error.messages)}')
+
+
+def parse_pub_date(value):
+    if value is None:
+        return None
+    try:
+        pub_date = parse_datetime(value)
+    except (TypeError, ValueError):
+        pub_date = None
+    if pub_date is None:
+        raise RecipeRecordError(f'Некорректная дата публикации {value}.')
+    return pub_date
+
+
+def has_valid_types(record):
+    return all(
+        isinstance(record[field], str)
+        for field in ('author', 'name', 'text', 'image')
+    ) and isinstance(record['tags'], list) and all(
+        isinstance(slug, str) for slug in record['tags']
+    ) and isinstance(record['ingredients'], list) and all(
+        isinstance(item, dict)
+        and {'name', 'measurement_unit', 'amount'} <= item.keys()
+        and isinstance(item['name'], str)
+        and isinstance(item['measurement_unit'], str)
+        for item in record['ingredients']
+    )
+
+
+def clean_ingredients(items):
+    if len({
+        (item['name'], item['measurement_unit']) for item in items
+    }) != len(items):
+        raise RecipeRecordError('Ингредиенты повторяются.')
+    for item in items:
+        item['amount'] = clean_value(
+            RecipeIngredientAmount, 'amount', item['amount']
+        )
+
+
+def parse_record(line):
+    """Проверенная запись рецепта из строки JSONL в формате
+    export_recipes.
+
+    Здесь проверяется всё, что не требует базы: типы, ограничения
+    полей моделей и повторы тегов и ингредиентов.
+    """
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError as error:
+        raise RecipeRecordError(f'Некорректный JSON: {error}.')
+    if not isinstance(record, dict):
+        raise RecipeRecordError('Ожидается JSON-объект.')
+    missing = [field for field in RECORD_FIELDS if field not in record]
+    if missing:
+        raise RecipeRecordError(f'Нет полей {", ".join(missing)}.')
+    if not has_valid_types(record):
+        raise RecipeRecordError('Некорректные поля, теги или ингредиенты.')
+    for field in ('name', 'text', 'cooking_time'):
+        record[field] = clean_value(Recipe, field, record[field])
+    if not record['image'] or len(record['image']) > (
+        Recipe._meta.get_field('image').max_length
+    ):
+        raise RecipeRecordError('Некорректный путь картинки.')
+    record['pub_date'] = parse_pub_date(record.get('pub_date'))
+    if not record['tags'] or not record['ingredients']:
+        raise RecipeRecordError('Нужны хотя бы один тег и один ингредиент.')
+    if len(set(record['tags'])) != len(record['tags']):
+        raise RecipeRecordError('Теги повторяются.')
+    clean_ingredients(record['ingredients'])
+    return record
+
+
+class RecipeLookups:
+    """Справочники авторов, тегов и ингредиентов для импорта пачками.
+
+    Недостающие ключи пачки загружаются одним запросом на справочник
+    и остаются в памяти до конца импорта. Ингредиенты, которых нет
+    в базе, создаются, если проходят проверки модели; остальные
+    запоминаются вместе с ошибкой.
+    """
+
+    def __init__(self):
+        self.authors = {}
+        self.tags = {}
+        self.ingredients = {}
+        self.invalid_ingredients = {}
+        self.created_ingredients = 0
+
+    def load(self, records):
+        usernames = {record['author'] for record in records} - set(
+            self.authors
+        )
+        if usernames:
+            self.authors.update(User.objects.filter(
+                username__in=usernames
+            ).values_list('username', 'pk'))
+        slugs = {
+            slug for record in records for slug in record['tags']
+        } - set(self.tags)
+        if slugs:
+            self.tags.update(
+                (slug, (pk, bit)) for slug, pk, bit in Tag.objects.filter(
+                    slug__in=slugs
+                ).values_list('slug', 'pk', 'bit')
+            )
+        keys = {
+            (item['name'], item['measurement_unit'])
+            for record in records for item in record['ingredients']
+        } - set(self.ingredients) - set(self.invalid_ingredients)
+        if keys:
+            self.load_ingredients(keys)
+
+    def load_ingredients(self, keys):
+        found = self.find_ingredients(keys)
+        new = []
+        for name, unit in keys - set(found):
+            ingredient = Ingredient(name=name, measurement_unit=unit)
+            try:
+                ingredient.clean_fields()
+            except ValidationError as error:
+                self.invalid_ingredients[name, unit] = ' '.join(
+                    error.messages
+                )
+            else:
+                new.append(ingredient)
+        if new:
+            missing = {
+                (ingredient.name, ingredient.measurement_unit)
+                for ingredient in new
+            }
+            # ignore_conflicts пропускает строки, вставленные другим
+            # процессом, и не сообщает, сколько вставлено.
+            count = Ingredient.objects.count()
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            self.created_ingredients += Ingredient.objects.count() - count
+            transaction.on_commit(
+                lambda: bump_generation(INGREDIENTS_GENERATION)
+            )
+            found.update(self.find_ingredients(missing))
+        self.ingredients.update(found)
+
+    @staticmethod
+    def find_ingredients(keys):
+        return {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            ).values_list('pk', 'name', 'measurement_unit')
+            if (name, unit) in keys
+        }
+
+    def build(self, record):
+        """Рецепт без pk, id его тегов и строки ингредиентов."""
+        if record['author'] not in self.authors:
+            raise RecipeRecordError(f'Нет автора {record["author"]}.')
+        unknown = [slug for slug in record['tags'] if slug not in self.tags]
+        if unknown:
+            raise RecipeRecordError(f'Нет тегов {", ".join(unknown)}.')
+        ingredients = []
+        for item in record['ingredients']:
+            key = item['name'], item['measurement_unit']
+            if key in self.invalid_ingredients:
+                raise RecipeRecordError(
+                    f'Ингредиент {key[0]}: {self.invalid_ingredients[key]}'
+                )
+            if key not in self.ingredients:
+                raise RecipeRecordError(f'Нет ингредиента {key[0]}.')
+            ingredients.append((self.ingredients[key], item['amount']))
+        tag_ids = [self.tags[slug][0] for slug in record['tags']]
+        recipe = Recipe(
+            author_id=self.authors[record['author']],
+            name=record['name'],
+            text=record['text'],
+            image=record['image'],
+            cooking_time=record['cooking_time'],
+            tags_mask=tags_mask(
+                self.tags[slug][1] for slug in record['tags']
+            ),
+            pub_date=record['pub_date'],
+        )
+        return recipe, tag_ids, ingredients
+
+
+def create_recipes(rows):
+    """Создаёт рецепты с тегами и ингредиентами одной транзакцией.
+
+    rows - тройки из RecipeLookups.build. bulk_create не шлёт сигналов,
+    поэтому маска тегов считается заранее, а поколение рецептов
+    сдвигается здесь. Заданная у рецепта дата публикации
+    восстанавливается после вставки, где её заменяет auto_now_add.
+    """
+    recipes = [recipe for recipe, _, _ in rows]
+    pub_dates = [recipe.pub_date for recipe in recipes]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save(force_insert=True)
+        dated = []
+        for recipe, pub_date in zip(recipes, pub_dates):
+            if pub_date:
+                recipe.pub_date = pub_date
+                dated.append(recipe)
+        if dated:
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, tag_ids, _ in rows for tag_id in tag_ids
+        )
+        RecipeIngredientAmount.objects.bulk_create(
+            RecipeIngredientAmount(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id, amount=amount
+            )
+            for recipe, _, ingredients in rows
+            for ingredient_id, amount in ingredients
+        )
+        log_changes(
+            ChangeLog.RECIPE, ChangeLog.CREATE,
+            [recipe.pk for recipe in recipes],
+        )
+        transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
+    if connection.features.can_return_rows_from_bulk_insert:
+        metrics.inc(
+            'foodgram_recipe_writes_total', len(recipes), action='create'
+        )
+    return recipes
@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.core.management import BaseCommand
+
+from core.storage import recipe_images_storage
+from recipes.models import Recipe
+
+IMAGES_DIR = 'recipes/images'
+GRACE_PERIOD = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки рецептов, на которые не ссылается ни один рецепт.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--grace-period', type=int, default=GRACE_PERIOD,
+            help='Не трогать файлы моложе этого числа секунд.',
+        )
+
+    def handle(self, *args, **options):
+        referenced = set(
+            Recipe._base_manager.values_list('image', flat=True).iterator()
+        )
+        root = recipe_images_storage.path(IMAGES_DIR)
+        deadline = time.time() - options['grace_period']
+        removed = freed = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(
+                    path, recipe_images_storage.location
+                ).replace(os.sep, '/')
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > deadline:
+                    continue
+                if not options['dry_run']:
+                    os.remove(path)
+                removed += 1
+                freed += stat.st_size
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        print(f'{action} {removed} файлов, {freed / 1024 ** 2:.1f} МБ.')
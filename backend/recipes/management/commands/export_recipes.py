@@ -0,0 +1,100 @@
+import sys
+import time
+from collections import defaultdict
+
+import orjson
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredientAmount
+
+RECIPE_FIELDS = ('pk', 'author__username', 'name', 'text', 'image',
+                 'cooking_time', 'pub_date')
+
+
+def recipe_records(ids):
+    """Записи пачки рецептов тремя запросами на пачку.
+
+    Связи подгружаются на пачку, как prefetch_related, но без объектов
+    моделей: у предзагруженных объектов циклические ссылки, и память
+    освобождается только сборщиком мусора.
+    """
+    tags = defaultdict(list)
+    for recipe_id, slug in Recipe.tags.through.objects.filter(
+        recipe_id__in=ids
+    ).order_by('tag_id').values_list('recipe_id', 'tag__slug'):
+        tags[recipe_id].append(slug)
+    ingredients = defaultdict(list)
+    for recipe_id, name, unit, amount in RecipeIngredientAmount.objects.filter(
+        recipe_id__in=ids
+    ).order_by('pk').values_list(
+        'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+        'amount',
+    ):
+        ingredients[recipe_id].append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+        )
+    for pk, author, name, text, image, cooking_time, pub_date in (
+        Recipe.objects.filter(pk__in=ids).order_by('pk').values_list(
+            *RECIPE_FIELDS
+        )
+    ):
+        yield {
+            'author': author,
+            'name': name,
+            'text': text,
+            'image': image,
+            'cooking_time': cooking_time,
+            'pub_date': pub_date,
+            'tags': tags[pk],
+            'ingredients': ingredients[pk],
+        }
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в JSONL: по рецепту в строке, автор '
+            'и теги - ссылками по username и slug, ингредиенты - по '
+            'названию и единице измерения. Картинки остаются в media.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdout.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        output = (
+            sys.stdout.buffer if options['path'] == '-'
+            else open(options['path'], 'wb')
+        )
+        total = 0
+        try:
+            for ids in self.id_chunks(options['chunk_size']):
+                output.writelines(
+                    orjson.dumps(record) + b'\n'
+                    for record in recipe_records(ids)
+                )
+                total += len(ids)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        elapsed = time.perf_counter() - started
+        print(f'Выгружено {total} рецептов за {elapsed:.1f} с, '
+              f'{total / max(elapsed, 1e-9):.0f} рецептов/с.',
+              file=sys.stderr)
+
+    @staticmethod
+    def id_chunks(chunk_size):
+        """id рецептов пачками, прочитанные потоком.
+
+        iterator() в Django 3.2 игнорирует prefetch_related, поэтому
+        потоком читаются только id, а связи грузятся на каждую пачку.
+        """
+        ids = []
+        for recipe_id in Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=chunk_size):
+            ids.append(recipe_id)
+            if len(ids) == chunk_size:
+                yield ids
+                ids = []
+        if ids:
+            yield ids
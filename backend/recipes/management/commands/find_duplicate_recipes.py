@@ -0,0 +1,36 @@
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.duplicates import index_recipes
+from recipes.models import Recipe, RecipeDuplicate
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает MinHash-подписи и LSH-индекс рецептов и ищет '
+            'среди них дубли. Рецепты идут по возрастанию id, поэтому '
+            'каждый сравнивается с уже проиндексированными, а пачка - '
+            'ещё и внутри себя. Найденные пары ждут проверки в админке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        known = RecipeDuplicate.objects.count()
+        batch = []
+        total = 0
+        for recipe_id in Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=options['batch_size']):
+            batch.append(recipe_id)
+            if len(batch) == options['batch_size']:
+                index_recipes(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            index_recipes(batch)
+            total += len(batch)
+        print(f'Проиндексировано {total} рецептов за '
+              f'{time.perf_counter() - started:.1f} с, новых похожих пар '
+              f'{RecipeDuplicate.objects.count() - known}.')
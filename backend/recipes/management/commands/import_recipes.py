@@ -0,0 +1,90 @@
+import sys
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db import DatabaseError
+
+from recipes.importing import (RecipeLookups, RecipeRecordError,
+                               create_recipes, parse_record)
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSONL, выгруженного export_recipes. '
+            'Рецепты добавляются к существующим, каждая пачка - '
+            'отдельной транзакцией. Ингредиенты ищутся по названию '
+            'и единице измерения, недостающие создаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        source = (
+            sys.stdin.buffer if options['path'] == '-'
+            else open(options['path'], 'rb')
+        )
+        lookups = RecipeLookups()
+        imported = skipped = 0
+        try:
+            lines = enumerate(source, start=1)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                created, errors = self.import_batch(lookups, batch)
+                imported += created
+                skipped += len(errors)
+                for number, error in errors:
+                    print(f'Строка {number}: {error}', file=sys.stderr)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        elapsed = time.perf_counter() - started
+        print(f'Загружено {imported} рецептов, пропущено {skipped}, '
+              f'создано ингредиентов {lookups.created_ingredients} '
+              f'за {elapsed:.1f} с, '
+              f'{imported / max(elapsed, 1e-9):.0f} рецептов/с.')
+
+    @staticmethod
+    def import_batch(lookups, lines):
+        records = []
+        errors = []
+        for number, line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append((number, parse_record(line)))
+            except RecipeRecordError as error:
+                errors.append((number, error))
+        lookups.load([record for _, record in records])
+        rows = []
+        for number, record in records:
+            try:
+                rows.append((number, lookups.build(record)))
+            except RecipeRecordError as error:
+                errors.append((number, error))
+        created = Command.create_rows(rows, errors)
+        return created, sorted(errors, key=lambda error: error[0])
+
+    @staticmethod
+    def create_rows(rows, errors):
+        """Создаёт рецепты пачки одной транзакцией. Если она
+        откатилась, рецепты создаются по одному, а записи, на которых
+        падает база, уходят в errors."""
+        if not rows:
+            return 0
+        try:
+            create_recipes([row for _, row in rows])
+            return len(rows)
+        except DatabaseError:
+            pass
+        created = 0
+        for number, row in rows:
+            try:
+                create_recipes([row])
+                created += 1
+            except DatabaseError as error:
+                errors.append((number, RecipeRecordError(error)))
+        return created
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from core.constants import TRENDING_HALF_LIFE_DAYS
+from recipes.models import Recipe
+from recipes.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги рецептов для ?ordering=trending|popular. '
+            'Запускается периодически, например из cron: порядок рецептов '
+            'точен с точностью до интервала запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--half-life', type=float, default=TRENDING_HALF_LIFE_DAYS,
+            help='Период полураспада trending в днях.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        now = timezone.now()
+        batch = []
+        total = 0
+        for recipe_id in Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=options['batch_size']):
+            batch.append(recipe_id)
+            if len(batch) == options['batch_size']:
+                refresh_rankings(batch, now, options['half_life'])
+                total += len(batch)
+                batch = []
+        if batch:
+            refresh_rankings(batch, now, options['half_life'])
+            total += len(batch)
+        print(f'Рейтинги пересчитаны у {total} рецептов '
+              f'за {time.perf_counter() - started:.1f} с.')
@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe, Tag
+from recipes.signals import sync_tags_mask
+
+
+class Command(BaseCommand):
+    help = ('Выдаёт биты маски тегам без них и пересчитывает маску '
+            'тегов у всех рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for tag in Tag.objects.filter(bit=None).order_by('pk'):
+            tag.save(update_fields=['bit'])
+        batch = []
+        total = 0
+        for recipe_id in Recipe.objects.values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=options['batch_size']):
+            batch.append(recipe_id)
+            if len(batch) == options['batch_size']:
+                total += len(sync_tags_mask(batch))
+                batch = []
+        if batch:
+            total += len(sync_tags_mask(batch))
+        print(f'Маска тегов пересчитана у {total} рецептов.')
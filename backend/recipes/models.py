@@ -1,14 +1,29 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import UniqueConstraint
 
 from core import validators
 from core import constants
+from core.storage import recipe_images_storage
 
 User = get_user_model()
 
 
+def tags_mask(bits):
+    """Битовая маска тегов по их номерам битов Tag.bit.
+
+    Теги без бита (созданные до его появления, пока не выполнена
+    sync_tags_mask) в маску не попадают.
+    """
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
 class Tag(models.Model):
     """Модель для тегов."""
 
@@ -38,6 +53,12 @@ class Tag(models.Model):
             validators.LatinCharRegexValidator(),
         )
     )
+    bit = models.PositiveSmallIntegerField(
+        verbose_name='Бит в маске тегов',
+        unique=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('name',)
@@ -48,6 +69,39 @@ class Tag(models.Model):
         """Возвращаем читаемую связку для админки."""
         return f'{self.name} (цвет: {self.color})'
 
+    @classmethod
+    def free_bit(cls):
+        """Наименьший незанятый бит маски тегов или None, если заняты все.
+
+        Бит удалённого тега освобождается: его маска уже снята
+        с рецептов сигналом tag_deleted.
+        """
+        used = set(cls.objects.exclude(bit=None).values_list(
+            'bit', flat=True
+        ))
+        return next(
+            (bit for bit in range(constants.MAX_TAG_BIT + 1)
+             if bit not in used),
+            None,
+        )
+
+    def clean(self):
+        super().clean()
+        if self.bit is None and self.free_bit() is None:
+            raise ValidationError(
+                f'Тегов не может быть больше {constants.MAX_TAG_BIT + 1}.'
+            )
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.free_bit()
+            if self.bit is None:
+                raise ValidationError(
+                    f'Тегов не может быть больше '
+                    f'{constants.MAX_TAG_BIT + 1}.'
+                )
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     """Модель для ингредиента."""
@@ -94,6 +148,13 @@ class Ingredient(models.Model):
         )
 
 
+class RecipeManager(models.Manager):
+    """Скрывает рецепты, поставленные в очередь на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pending_deletion=False)
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -115,6 +176,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/images/',
+        storage=recipe_images_storage,
     )
     text = models.TextField(
         verbose_name='Описание',
@@ -134,6 +196,12 @@ class Recipe(models.Model):
         help_text='Выбирете теги для рецепта',
         related_name='recipe_tags',
     )
+    tags_mask = models.BigIntegerField(
+        verbose_name='Маска тегов',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления (в минутах)',
         help_text='Введите время приготовления рецепта',
@@ -150,6 +218,18 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    pending_deletion = models.BooleanField(
+        verbose_name='Ожидает удаления',
+        default=False,
+        db_index=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         ordering = ('-pub_date', 'name',)
@@ -263,3 +343,178 @@ class Cart(AbstractUsersRecipe):
 
     def __str__(self):
         return f'Дата добавления в корзину: {self.add_to_shopping_cart_date}'
+
+
+class CartIngredient(AbstractUsersRecipe):
+    """Модель недостающих ингредиентов рецепта в списке покупок"""
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+    amount = models.PositiveSmallIntegerField(
+        verbose_name='Количество',
+        validators=(
+            validators.MinAmountValidator(
+                constants.MIN_AMOUNT
+            ),
+            validators.MaxAmountValidator(
+                constants.MAX_AMOUNT
+            )
+        )
+    )
+
+    class Meta(AbstractUsersRecipe.Meta):
+        default_related_name = 'cart_ingredients'
+        verbose_name = 'Недостающий ингредиент в корзине'
+        verbose_name_plural = 'Недостающие ингредиенты в корзине'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe', 'ingredient'),
+                name='unique_cart_ingredient',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} :: {self.ingredient} ({self.recipe})'
+
+
+class RecipeRanking(models.Model):
+    """Рейтинги рецепта, пересчитываемые командой refresh_rankings."""
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+    )
+    trending = models.FloatField(
+        verbose_name='Популярность сейчас',
+        default=0,
+        db_index=True,
+    )
+    popular = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+        db_index=True,
+    )
+    refreshed_at = models.DateTimeField(
+        verbose_name='Дата пересчёта',
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.trending:.2f} / {self.popular}'
+
+
+class RecipeSignature(models.Model):
+    """MinHash-подпись рецепта для поиска дублей (recipes.duplicates)."""
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+    minhash = models.BinaryField(
+        verbose_name='MinHash-подпись',
+    )
+    indexed_at = models.DateTimeField(
+        verbose_name='Дата индексации',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH-индекса: хеш одной полосы подписи рецепта."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+    )
+    band = models.PositiveSmallIntegerField(
+        verbose_name='Полоса',
+    )
+    bucket = models.BigIntegerField(
+        verbose_name='Хеш полосы',
+    )
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = (
+            models.Index(fields=('band', 'bucket')),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'band'),
+                name='unique_recipe_band',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
+
+
+class RecipeDuplicate(models.Model):
+    """Возможный дубль рецепта, ожидающий проверки администратором."""
+    NEW = 'new'
+    CONFIRMED = 'confirmed'
+    DISMISSED = 'dismissed'
+    STATUSES = (
+        (NEW, 'Не проверен'),
+        (CONFIRMED, 'Дубль'),
+        (DISMISSED, 'Не дубль'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='duplicates',
+    )
+    original = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий более ранний рецепт',
+        on_delete=models.CASCADE,
+        related_name='copies',
+    )
+    similarity = models.FloatField(
+        verbose_name='Оценка сходства',
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUSES,
+        default=NEW,
+        db_index=True,
+    )
+    found_at = models.DateTimeField(
+        verbose_name='Дата обнаружения',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ('-found_at',)
+        verbose_name = 'Возможный дубль рецепта'
+        verbose_name_plural = 'Возможные дубли рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'original'),
+                name='unique_recipe_duplicate',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.original_id}: {self.similarity:.2f}'
@@ -0,0 +1,54 @@
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.constants import TRENDING_HALF_LIFE_DAYS, TRENDING_WINDOW_HALF_LIVES
+from core.generations import RANKINGS_GENERATION, bump_generation
+from recipes.models import Cart, FavoriteRecipe, RecipeRanking
+
+
+def decayed_score(dates, now, half_life):
+    """Сумма добавлений, каждое из которых весит вдвое меньше
+    за каждый прошедший период полураспада."""
+    return sum(
+        math.exp(-math.log(2) * (now - date) / half_life) for date in dates
+    )
+
+
+def refresh_rankings(recipe_ids, now, half_life_days=TRENDING_HALF_LIFE_DAYS):
+    """Пересчитывает рейтинги пачки рецептов одной короткой транзакцией.
+
+    trending - затухающая сумма добавлений в избранное и в корзину,
+    добавления старше TRENDING_WINDOW_HALF_LIVES периодов не читаются:
+    их вклад меньше тысячной. popular - число добавлений в избранное.
+    """
+    half_life = timedelta(days=half_life_days)
+    since = now - half_life * TRENDING_WINDOW_HALF_LIVES
+    dates = defaultdict(list)
+    for model, field in (
+        (FavoriteRecipe, 'add_to_favorite_date'),
+        (Cart, 'add_to_shopping_cart_date'),
+    ):
+        for recipe_id, date in model.objects.filter(
+            recipe_id__in=recipe_ids, **{f'{field}__gte': since}
+        ).order_by().values_list('recipe_id', field):
+            dates[recipe_id].append(date)
+    popular = Counter(dict(
+        FavoriteRecipe.objects.filter(recipe_id__in=recipe_ids).order_by()
+        .values('recipe_id').annotate(total=Count('pk'))
+        .values_list('recipe_id', 'total')
+    ))
+    with transaction.atomic():
+        RecipeRanking.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeRanking.objects.bulk_create(
+            RecipeRanking(
+                recipe_id=recipe_id,
+                trending=decayed_score(dates[recipe_id], now, half_life),
+                popular=popular[recipe_id],
+                refreshed_at=now,
+            ) for recipe_id in recipe_ids
+        )
+        transaction.on_commit(lambda: bump_generation(RANKINGS_GENERATION))
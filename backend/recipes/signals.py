@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.generations import (INGREDIENTS_GENERATION, RECIPES_GENERATION,
+                              TAGS_GENERATION, bump_generation)
+from recipes.models import Ingredient, Recipe, Tag, tags_mask
+
+
+def sync_tags_mask(recipe_ids):
+    """Пересчитывает маску тегов рецептов по промежуточной таблице.
+
+    Заодно сдвигает дату изменения рецептов: теги входят в их ответ.
+    """
+    bits = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, bit in Recipe.tags.through.objects.filter(
+        recipe_id__in=bits
+    ).values_list('recipe_id', 'tag__bit'):
+        bits[recipe_id].append(bit)
+    masks = {
+        recipe_id: tags_mask(recipe_bits)
+        for recipe_id, recipe_bits in bits.items()
+    }
+    for mask in set(masks.values()):
+        Recipe.objects.filter(pk__in=[
+            recipe_id for recipe_id in masks if masks[recipe_id] == mask
+        ]).update(tags_mask=mask, updated_at=timezone.now())
+    return masks
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    """Сдвигает поколение рецептов после фиксации транзакции.
+
+    Строки ингредиентов меняются только вместе с сохранением самого
+    рецепта (WriteRecipeSerializer.update, админка), которое сдвигает
+    и поколение, и updated_at. Приёмников у RecipeIngredientAmount нет,
+    чтобы их удаление оставалось одним DELETE.
+    """
+    transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    """Держит маску тегов в согласии со связью рецепта с тегами."""
+    if action == 'pre_clear' and reverse:
+        instance._cleared_recipe_ids = list(
+            instance.recipe_tags.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear' and reverse:
+        sync_tags_mask(instance._cleared_recipe_ids)
+    elif action in ('post_add', 'post_remove') and reverse:
+        sync_tags_mask(pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        instance.tags_mask = sync_tags_mask([instance.pk])[instance.pk]
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_recipes(instance, **kwargs):
+    instance._cleared_recipe_ids = list(
+        instance.recipe_tags.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(instance, **kwargs):
+    sync_tags_mask(instance._cleared_recipe_ids)
+    transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_generation(TAGS_GENERATION))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(lambda: bump_generation(INGREDIENTS_GENERATION))
@@ -1,10 +1,12 @@
 from django.contrib import admin
 
 from .models import Subscription, User
+from core.admin import DeferredDeletionAdmin, count_subquery, input_filter
+from recipes.models import Recipe
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(DeferredDeletionAdmin):
     """Админ панель модели пользователя."""
 
     list_display = (
@@ -16,17 +18,34 @@ class UserAdmin(admin.ModelAdmin):
         'count_recipe',
     )
     list_filter = (
-        'email',
+        'is_staff',
+        'is_active',
+    )
+    search_fields = (
         'username',
+        'email',
     )
+    show_full_result_count = False
 
-    @admin.display(description='Количество подписок')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            following_count=count_subquery(Subscription, 'author'),
+            recipes_count=count_subquery(Recipe, 'author'),
+        )
+
+    @admin.display(
+        description='Количество подписок',
+        ordering='following_count',
+    )
     def count_following(self, obj):
-        return obj.author_in_subscription.count()
+        return obj.following_count
 
-    @admin.display(description='Количество рецептов в избранном')
+    @admin.display(
+        description='Количество рецептов в избранном',
+        ordering='recipes_count',
+    )
     def count_recipe(self, obj):
-        return obj.recipe_author.count()
+        return obj.recipes_count
 
 
 @admin.register(Subscription)
@@ -39,6 +58,15 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'subscription_date',
     )
     list_filter = (
+        input_filter('user', 'user__username', 'подписчику'),
+        input_filter('author', 'author__username', 'автору'),
+    )
+    list_select_related = (
+        'user',
+        'author',
+    )
+    autocomplete_fields = (
         'user',
         'author',
     )
+    show_full_result_count = False
@@ -55,6 +55,10 @@ class User(AbstractUser):
         help_text='Введите свой пароль'
 
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
         'username',